@@ -0,0 +1,199 @@
+"""
+Solve a file of matchups on a process pool.
+
+    python poker_batch.py matchups.jsonl results.jsonl [--processes N] [--cache PATH]
+
+Each input row, a JSON line or a CSV row with a header, holds a hero hand, a villain hand,
+range or nothing (unknown opponent), a board and dead cards:
+
+    {"id": 1, "hero": "AC QH", "villain": "TC TH", "board": "KH", "dead": "8H 5S"}
+    {"id": 2, "hero": ["AC", "QH"], "villain": "QQ+, AKs", "board": ""}
+
+    id,hero,villain,board,dead
+    1,AC QH,TC TH,KH,8H 5S
+
+Every result is written as a JSON line holding the input row, its line number and either
+win, lose, tie and equity, a villain_equity against a range, or an error. The rows are read
+BLOCK_SIZE at a time, the matchups of a block equivalent under suit symmetry being computed
+once, and the last RECENT_SIZE results being reused, so that memory does not depend on the
+size of the file. Known and unknown villain counts can also be kept in an EquityCache.
+"""
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import OrderedDict
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+from poker_solver import (
+    RANGE_VALUES, SUIT_LETTERS, EquityCache, deal, matchup_key, range_equity, solve_exact)
+
+
+BLOCK_SIZE = 1024
+RECENT_SIZE = 4096
+
+
+def read_matchups(path):
+    """
+    Yield (line number, row) of a JSONL or CSV (by extension) file, one at a time, the row
+    of a JSON line that is not an object being {"error": ...}
+    """
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            for line, row in enumerate(csv.DictReader(f), 2):
+                yield line, row
+        else:
+            for line, text in enumerate(f, 1):
+                if text.strip():
+                    try:
+                        row = json.loads(text)
+                    except ValueError as e:
+                        row = {"error": "{}: {}".format(type(e).__name__, e)}
+                    if not isinstance(row, dict):
+                        row = {"error": "Expected a JSON object, got {}".format(type(row).__name__)}
+                    yield line, row
+
+
+def parse_cards(field):
+    """
+    Card names of a list, or of a string of names separated by spaces or commas, or joined
+    """
+    if not field:
+        return []
+    if not isinstance(field, str):
+        return [card.upper() for card in field]
+    cards = field.replace(",", " ").upper().split()
+    if len(cards) == 1 and len(cards[0]) > 2 and len(cards[0]) % 2 == 0:
+        cards = [cards[0][i:i + 2] for i in range(0, len(cards[0]), 2)]
+    return cards
+
+
+def is_card(name):
+    return len(name) == 2 and name[0] in RANGE_VALUES and name[1] in SUIT_LETTERS
+
+
+def parse_matchup(row):
+    """
+    (spec, key) of a row, spec being the picklable task of solve_matchup and key the same for
+    all the matchups equivalent under suit symmetry
+    """
+    hero, board, dead = parse_cards(row["hero"]), parse_cards(row.get("board")), parse_cards(row.get("dead"))
+    villain = row.get("villain") or ""
+    villain_cards = parse_cards(villain)
+    if not villain_cards or (len(villain_cards) == 2 and all(map(is_card, villain_cards))):
+        deck, hero, villain_cards, board = deal(hero, villain_cards, board, dead)
+        if len(hero) != 2 or len(board) > 5:
+            raise ValueError("Expected a 2 cards hero and at most 5 board cards")
+        return ("hand", hero, villain_cards, board, deck), ("hand",) + matchup_key(hero, villain_cards, board, deck)
+    # ranges are only deduplicated when written the same way
+    villain = villain if isinstance(villain, str) else ",".join(map(str, villain))
+    spec = ("range", tuple(hero), villain, tuple(board), tuple(dead))
+    return spec, ("range", tuple(sorted(hero)), villain.replace(" ", ""), tuple(sorted(board)), tuple(sorted(dead)))
+
+
+def solve_matchup(spec):
+    """
+    Result fields of a matchup spec of parse_matchup
+    """
+    if spec[0] == "hand":
+        _, hero, villain, board, deck = spec
+        win, lose, tie = solve_exact(hero, villain, board, deck)
+        return {"win": win, "lose": lose, "tie": tie, "equity": (win + tie / 2) / (win + lose + tie)}
+    _, hero, villain, board, dead = spec
+    equity, villain_equity, _, _ = range_equity([hero], villain, board, dead)
+    return {"equity": equity, "villain_equity": villain_equity}
+
+
+def _solve_group(task):
+    key, spec = task
+    try:
+        return key, solve_matchup(spec)
+    except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+        return key, {"error": "{}: {}".format(type(e).__name__, e)}
+
+
+def run_batch(input_path, output_path, number_of_processes=None, cache_path=None, block_size=BLOCK_SIZE):
+    """
+    Solve every matchup of input_path and write its result to output_path as soon as its
+    group is done. Return the counters of the run
+    """
+    stats = {"rows": 0, "solved": 0, "reused": 0, "errors": 0}
+    recent = OrderedDict()
+    cache = EquityCache(cache_path) if cache_path else None
+    rows = read_matchups(input_path)
+
+    def write(out, line, row, result):
+        out.write(json.dumps(dict(row, line=line, **result)) + "\n")
+        stats["errors"] += "error" in result
+
+    def remember(key, result):
+        recent[key] = result
+        recent.move_to_end(key)
+        if len(recent) > RECENT_SIZE:
+            recent.popitem(last=False)
+
+    with Pool(number_of_processes or cpu_count()) as pool, open(output_path, "w") as out:
+        for block in iter(lambda: list(islice(rows, block_size)), []):
+            groups = OrderedDict()
+            for line, row in block:
+                stats["rows"] += 1
+                if set(row) == {"error"}:
+                    # line not decoded by read_matchups
+                    write(out, line, {}, row)
+                    continue
+                try:
+                    spec, key = parse_matchup(row)
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    write(out, line, row, {"error": "{}: {}".format(type(e).__name__, e)})
+                    continue
+                result = recent.get(key)
+                if result is None and cache is not None and key[0] == "hand":
+                    counts = cache.get(key[1:])
+                    if counts is not None:
+                        win, lose, tie = counts
+                        result = {"win": win, "lose": lose, "tie": tie,
+                                  "equity": (win + tie / 2) / (win + lose + tie)}
+                if result is not None:
+                    stats["reused"] += 1
+                    write(out, line, row, result)
+                elif key in groups:
+                    stats["reused"] += 1
+                    groups[key][1].append((line, row))
+                else:
+                    groups[key] = (spec, [(line, row)])
+
+            tasks = [(key, spec) for key, (spec, _) in groups.items()]
+            for key, result in pool.imap_unordered(_solve_group, tasks):
+                stats["solved"] += 1
+                for line, row in groups[key][1]:
+                    write(out, line, row, result)
+                if "error" not in result:
+                    remember(key, result)
+                    if cache is not None and key[0] == "hand":
+                        cache.put(key[1:], (result["win"], result["lose"], result["tie"]))
+            out.flush()
+    if cache is not None:
+        cache.close()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a JSONL or CSV file of matchups")
+    parser.add_argument("input", help="JSONL file, or CSV file with a .csv extension")
+    parser.add_argument("output", help="JSONL results file")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--cache", default=None, help="EquityCache sqlite file of the known matchups")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    args = parser.parse_args(argv)
+
+    t0 = time.time()
+    stats = run_batch(args.input, args.output, args.processes, args.cache, args.block_size)
+    print("{rows} rows, {solved} solved, {reused} reused, {errors} errors".format(**stats),
+          "TIME=", time.time() - t0)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Throughput benchmarks of the poker_solver evaluators and solvers.
+
+    python poker_bench.py run [--processes N] [--repeat R] [--output poker_bench.json]
+    python poker_bench.py compare baseline.json poker_bench.json [--tolerance 0.1]
+
+run measures weigh_hand and best-of-7 evaluations per second, then the end-to-end time of
+each fixed scenario for 1 to N worker processes, and writes the results to a JSON file.
+compare flags every result of a run worse than the baseline by more than the tolerance,
+and exits with status 1 when there is any.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from multiprocessing import cpu_count
+
+from poker_solver import MYCARDS, weigh_hand, weigh_best_hand, poker_solve_parallel
+
+
+# name: (main_hand, face_hand, partial_flop), an empty face_hand being an unknown opponent
+SCENARIOS = {
+    "preflop": (("AC", "QH"), ("TC", "TH"), ()),
+    "flop": (("AC", "QH"), ("TC", "TH"), ("KH", "7D", "2S")),
+    "unknown": (("AC", "QH"), (), ("KH",)),
+}
+
+EVAL_HANDS = 100000
+
+
+def best_time(function, repeat):
+    """
+    Best wall time of repeat calls of function, and its last result
+    """
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_evaluators(repeat, seed=0):
+    """
+    weigh_hand evaluations per second on 5 MyCard hands, and weigh_best_hand evaluations
+    per second on 7 integer cards hands
+    """
+    rng = random.Random(seed)
+    hands7 = [rng.sample(range(52), 7) for _ in range(EVAL_HANDS)]
+    hands5 = [[MYCARDS[card] for card in hand[:5]] for hand in hands7]
+
+    seconds, _ = best_time(lambda: [weigh_hand(hand) for hand in hands5], repeat)
+    results = {"weigh_hand": {"value": EVAL_HANDS / seconds, "unit": "evals/s"}}
+    seconds, _ = best_time(lambda: [weigh_best_hand(hand) for hand in hands7], repeat)
+    results["best_of_7"] = {"value": EVAL_HANDS / seconds, "unit": "evals/s"}
+    return results
+
+
+def bench_scenarios(processes, repeat):
+    """
+    End-to-end time of each scenario for 1 to processes worker processes
+    """
+    results = {}
+    for name, (main_hand, face_hand, partial_flop) in SCENARIOS.items():
+        for number_of_processes in range(1, processes + 1):
+            seconds, counts = best_time(
+                lambda: poker_solve_parallel(main_hand, face_hand, partial_flop, number_of_processes), repeat)
+            results["{}/{}".format(name, number_of_processes)] = {
+                "value": seconds, "unit": "s", "counts": list(counts)}
+    return results
+
+
+def run(processes, repeat, output):
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": cpu_count(),
+        "results": {},
+    }
+    report["results"].update(bench_evaluators(repeat))
+    report["results"].update(bench_scenarios(processes, repeat))
+
+    for name, result in report["results"].items():
+        print("{:<16} {:>14.4f} {}".format(name, result["value"], result["unit"]))
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Results written to", output)
+    return report
+
+
+def compare(baseline, current, tolerance):
+    """
+    Print the relative change of each result of current against baseline, and return the
+    names of those worse by more than tolerance: evals/s going down, seconds going up
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print("{:<16} {:>14.4f} {}   (no baseline)".format(name, result["value"], result["unit"]))
+            continue
+        change = result["value"] / reference["value"] - 1
+        if result["unit"] == "s":
+            change = -change
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        if "counts" in reference and reference["counts"] != result["counts"]:
+            regressions.append(name)
+            flag += "  COUNTS DIFFER"
+        print("{:<16} {:>14.4f} {:>14.4f} {}  {:+.1%}{}".format(
+            name, reference["value"], result["value"], result["unit"], change, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="poker_solver throughput benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks and write them to a JSON file")
+    run_parser.add_argument("--processes", type=int, default=cpu_count(),
+                            help="benchmark the scenarios for 1 to PROCESSES worker processes")
+    run_parser.add_argument("--repeat", type=int, default=3, help="keep the best of REPEAT runs")
+    run_parser.add_argument("--output", default="poker_bench.json")
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1,
+                                help="relative slowdown tolerated before flagging a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        run(args.processes, args.repeat, args.output)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.tolerance)
+    if regressions:
+        print("{} regression(s): {}".format(len(regressions), ", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
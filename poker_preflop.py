@@ -0,0 +1,260 @@
+"""
+Exact heads-up preflop counts of every matchup of two starting hands, each suit isomorphic
+matchup (169 x 169 classes by suit pattern) being solved once.
+
+    python poker_preflop.py build poker_preflop.bin [--processes N] [--limit N] [--time-budget S]
+    python poker_preflop.py status poker_preflop.bin
+    python poker_preflop.py query poker_preflop.bin AC,QH TC,TH
+    python poker_preflop.py query poker_preflop.bin AKs QQ
+
+The file holds a header, the matchup id of every ordered pair of the 1326 hands (its high
+bit telling the counts are the ones of the opponent), the representative pair of hands of
+each id and the (win, lose, tie) counts of each id, zero until solved. build creates the
+file on its first run then solves the missing matchups, as many as --limit or
+--time-budget allow, so that the matrix can be filled in over several runs. Queries map the
+file and read the counts of two hands in constant time.
+"""
+import os
+import sys
+import mmap
+import time
+import argparse
+from array import array
+from itertools import combinations
+from multiprocessing import Pool, cpu_count
+
+from poker_solver import (
+    FULL_MASK, RANGE_VALUES, SUIT_LETTERS, to_int, deal, cards_mask, canonical_matchup, parse_range, solve_exact)
+
+
+MAGIC = b"PKSPRE01"
+HANDS = list(combinations(range(52), 2))
+HAND_INDEX = {hand: i for i, hand in enumerate(HANDS)}
+SWAPPED = 1 << 31
+NO_MATCHUP = 0xFFFFFFFF
+FLUSH_EVERY = 64
+
+
+def hand_index(hand) -> int:
+    """
+    Index in HANDS of a 2 cards hand (names or integers)
+    """
+    return HAND_INDEX[tuple(sorted(map(to_int, hand)))]
+
+
+def _matchups():
+    """
+    (index, representatives) of every ordered pair (i, j) of hands: index[i * len(HANDS) + j]
+    is the id of the matchup, with SWAPPED when it is solved as (j, i), and representatives
+    the (i, j) pair of hands solved for each id
+    """
+    size = len(HANDS)
+    index = array("I", [NO_MATCHUP]) * (size * size)
+    representatives = array("H")
+    ids = {}
+    masks = [cards_mask(hand) for hand in HANDS]
+    for i in range(size):
+        for j in range(i + 1, size):
+            if masks[i] & masks[j]:
+                continue
+            deck_mask = FULL_MASK & ~(masks[i] | masks[j])
+            forward = canonical_matchup(masks[i], masks[j], 0, deck_mask)
+            backward = canonical_matchup(masks[j], masks[i], 0, deck_mask)
+            key = min(forward, backward)
+            matchup = ids.get(key)
+            if matchup is None:
+                matchup = ids[key] = len(ids)
+                representatives.extend((i, j) if key == forward else (j, i))
+            index[i * size + j] = matchup | (SWAPPED if forward != key else 0)
+            index[j * size + i] = matchup | (SWAPPED if backward != key else 0)
+    return index, representatives
+
+
+def create_matrix(path):
+    """
+    Write the file of the matrix, every matchup being unsolved
+    """
+    index, representatives = _matchups()
+    number_of_matchups = len(representatives) // 2
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as f:
+        f.write(MAGIC)
+        f.write(array("I", [len(HANDS), number_of_matchups]).tobytes())
+        f.write(index.tobytes())
+        f.write(representatives.tobytes())
+        f.write(bytes(4 * 3 * number_of_matchups))
+    os.replace(temporary, path)
+
+
+class PreflopMatrix:
+    """
+    Memory map of a preflop matrix file, writable for build_matrix
+    """
+    def __init__(self, path, write=False):
+        with open(path, "r+b" if write else "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if write else mmap.ACCESS_READ)
+        size, self.number_of_matchups = array("I", self.data[8:16])
+        if self.data[:8] != MAGIC or size != len(HANDS):
+            raise ValueError("{} is not a preflop matrix file".format(path))
+        view = memoryview(self.data)
+        start = 16
+        self.index = view[start:start + 4 * size * size].cast("I")
+        start += 4 * size * size
+        self.representatives = view[start:start + 4 * self.number_of_matchups].cast("H")
+        start += 4 * self.number_of_matchups
+        self.table = view[start:start + 12 * self.number_of_matchups].cast("I")
+
+    def counts(self, main_hand, face_hand):
+        """
+        Hero (win, lose, tie) counts of main_hand against face_hand over the 1,712,304
+        boards, None if their matchup is not solved yet
+        """
+        matchup = self.index[hand_index(main_hand) * len(HANDS) + hand_index(face_hand)]
+        if matchup == NO_MATCHUP:
+            raise ValueError("Hands sharing a card")
+        offset = 3 * (matchup & ~SWAPPED)
+        win, lose, tie = self.table[offset:offset + 3]
+        if not win + lose + tie:
+            return None
+        return (lose, win, tie) if matchup & SWAPPED else (win, lose, tie)
+
+    def equity(self, main_hand, face_hand):
+        counts = self.counts(main_hand, face_hand)
+        if counts is None:
+            return None
+        win, lose, tie = counts
+        return (win + tie / 2) / (win + lose + tie)
+
+    def range_equity(self, main_range, face_range):
+        """
+        Equity of a range against another one (see parse_range) from the counts of their
+        combos not sharing a card, None if one of their matchups is not solved yet
+        """
+        won, total = 0., 0.
+        face_range = parse_range(face_range)
+        for main_hand, main_weight in parse_range(main_range).items():
+            for face_hand, face_weight in face_range.items():
+                if set(main_hand) & set(face_hand):
+                    continue
+                counts = self.counts(main_hand, face_hand)
+                if counts is None:
+                    return None
+                win, lose, tie = counts
+                won += main_weight * face_weight * (win + tie / 2)
+                total += main_weight * face_weight * (win + lose + tie)
+        return won / total if total else None
+
+    def pending(self):
+        """
+        Ids of the matchups not solved yet
+        """
+        table = self.table
+        return [matchup for matchup in range(self.number_of_matchups)
+                if not (table[3 * matchup] or table[3 * matchup + 1] or table[3 * matchup + 2])]
+
+    def store(self, matchup, counts):
+        self.table[3 * matchup:3 * matchup + 3] = array("I", counts)
+
+    def close(self):
+        for view in (self.index, self.representatives, self.table):
+            view.release()
+        self.data.close()
+
+
+def parse_side(text):
+    """
+    (card, card) hand of a comma separated pair of cards ("AC,QH"), or the text itself for
+    any other range (see parse_range)
+    """
+    cards = [card.strip() for card in text.upper().split(",")]
+    if len(cards) == 2 and all(len(card) == 2 and card[0] in RANGE_VALUES and card[1] in SUIT_LETTERS
+                               for card in cards):
+        return tuple(cards)
+    return text
+
+
+def solve_matchup(task):
+    """
+    (matchup, counts) of a (matchup, main_hand, face_hand) task, every board being played
+    """
+    matchup, main_hand, face_hand = task
+    deck, main_hand, face_hand, _ = deal(main_hand, face_hand)
+    return matchup, solve_exact(main_hand, face_hand, (), deck)
+
+
+def build_matrix(path, number_of_processes=None, limit=None, time_budget=None, verbose=False):
+    """
+    Solve the matchups missing from the matrix file of path, creating it first if needed,
+    until limit matchups are solved or time_budget seconds are elapsed. Solved counts are
+    stored as they come and flushed every FLUSH_EVERY matchups, so that an interrupted build
+    only loses the matchups in progress. Return the number of matchups still missing
+    """
+    t0 = time.time()
+    if not os.path.exists(path):
+        create_matrix(path)
+    matrix = PreflopMatrix(path, write=True)
+    try:
+        pending = matrix.pending()
+        tasks = [(matchup, HANDS[matrix.representatives[2 * matchup]], HANDS[matrix.representatives[2 * matchup + 1]])
+                 for matchup in pending[:limit]]
+        solved = 0
+        with Pool(number_of_processes or cpu_count()) as pool:
+            for matchup, counts in pool.imap_unordered(solve_matchup, tasks):
+                matrix.store(matchup, counts)
+                solved += 1
+                if not solved % FLUSH_EVERY:
+                    matrix.data.flush()
+                    if verbose:
+                        print("{}/{} matchups, {:.0f}s".format(solved, len(pending), time.time() - t0))
+                if time_budget is not None and time.time() - t0 > time_budget:
+                    break
+        matrix.data.flush()
+        return len(pending) - solved
+    finally:
+        matrix.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preflop heads-up matrix")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="solve the missing matchups of the matrix")
+    build_parser.add_argument("path")
+    build_parser.add_argument("--processes", type=int, default=None)
+    build_parser.add_argument("--limit", type=int, default=None, help="solve at most LIMIT matchups")
+    build_parser.add_argument("--time-budget", type=float, default=None, help="stop after TIME_BUDGET seconds")
+    status_parser = commands.add_parser("status", help="print the number of matchups solved")
+    status_parser.add_argument("path")
+    query_parser = commands.add_parser("query", help="equity of two hands or two ranges")
+    query_parser.add_argument("path")
+    query_parser.add_argument("main", help="comma separated cards (AC,QH) or range (AKs, QQ+)")
+    query_parser.add_argument("face")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        missing = build_matrix(args.path, args.processes, args.limit, args.time_budget, verbose=True)
+        print("{} matchups missing".format(missing))
+        return 0
+    matrix = PreflopMatrix(args.path)
+    try:
+        if args.command == "status":
+            missing = len(matrix.pending())
+            print("{}/{} matchups solved".format(matrix.number_of_matchups - missing, matrix.number_of_matchups))
+            return 0
+        main_side, face_side = parse_side(args.main), parse_side(args.face)
+        try:
+            if isinstance(main_side, tuple) and isinstance(face_side, tuple):
+                print(matrix.counts(main_side, face_side), matrix.equity(main_side, face_side))
+            else:
+                # a single hand facing a range is the range of that hand alone
+                as_range = lambda side: [side] if isinstance(side, tuple) else side
+                print(matrix.range_equity(as_range(main_side), as_range(face_side)))
+        except ValueError as e:
+            print("Error:", e)
+            return 1
+        return 0
+    finally:
+        matrix.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
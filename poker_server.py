@@ -0,0 +1,302 @@
+"""
+Long-lived poker_solver service speaking JSON lines over TCP or a Unix socket.
+
+    python poker_server.py serve [--host 127.0.0.1] [--port 7463 | --unix PATH] [--processes N]
+    python poker_server.py query AC,QH [TC,TH] [--board KH] [--dead 8H,5S] [--port 7463 | --unix PATH]
+    python poker_server.py stats [--port 7463 | --unix PATH]
+
+Each request is a line {"id": ..., "main": ["AC", "QH"], "face": ["TC", "TH"], "board": ["KH"],
+"dead": ["8H"]}, an empty or missing face being an unknown opponent, answered by a line {"id": ..., "win": ...,
+"lose": ..., "tie": ..., "equity": ...} or {"id": ..., "error": ...}, in completion order.
+{"op": "stats"} returns the server counters.
+
+The worker pool is started once with the lookup tables loaded. Requests on suit isomorphic
+matchups in flight are computed once. Known opponent requests with few boards left are
+gathered for BATCH_WINDOW seconds and solved per board in a single enumeration pass.
+"""
+import sys
+import json
+import math
+import socket
+import asyncio
+import argparse
+from itertools import combinations
+from multiprocessing import cpu_count
+from concurrent.futures import ProcessPoolExecutor
+
+from poker_solver import (
+    CHUNKS_PER_PROCESS, RANK_TABLE, to_int, deal, cards_mask, hand_key, weigh_key, matchup_key, solve_exact)
+
+
+DEFAULT_PORT = 7463
+BATCH_WINDOW = 0.005
+# requests with at most BATCH_BOARDS boards left (flop given or later) are batched
+BATCH_BOARDS = 2000
+
+
+def _warm():
+    """
+    Run once in each worker so that the pool processes exist with the tables built
+    """
+    return len(RANK_TABLE)
+
+
+def solve_batch(partial_flop, dead_cards, matchups):
+    """
+    (win, lose, tie) counts of each (main_hand, face_hand) of matchups over every board
+    completing partial_flop without dead_cards, the boards being enumerated and summed once
+    for all of them
+    """
+    flop_key, flop_mask = hand_key(partial_flop)
+    dead_mask = cards_mask(dead_cards)
+    cards = [card for card in range(52) if not (flop_mask | dead_mask) >> card & 1]
+    hands = [(hand_key(main_hand), hand_key(face_hand), cards_mask(main_hand + face_hand))
+             for main_hand, face_hand in matchups]
+    counts = [[0, 0, 0] for _ in matchups]
+    for board in combinations(cards, 5 - len(partial_flop)):
+        key, mask = hand_key(board)
+        key, mask = key + flop_key, mask | flop_mask
+        for ((main_key, main_mask), (face_key, face_mask), used), count in zip(hands, counts):
+            if mask & used:
+                continue
+            main_value = weigh_key(main_key + key, main_mask | mask)
+            face_value = weigh_key(face_key + key, face_mask | mask)
+            count[0 if main_value > face_value else 1 if main_value < face_value else 2] += 1
+    return [tuple(count) for count in counts]
+
+
+class SolverServer:
+    """
+    Solve requests on a warm process pool, coalescing identical matchups in flight and
+    batching the small ones sharing a board
+    """
+    def __init__(self, number_of_processes=None, batch_window=BATCH_WINDOW):
+        self.number_of_processes = number_of_processes or cpu_count()
+        self.batch_window = batch_window
+        self.executor = None
+        self.inflight = {}
+        self.pending = {}
+        self.stats = {"requests": 0, "coalesced": 0, "batches": 0, "batched": 0, "errors": 0}
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(self.number_of_processes)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm)
+                               for _ in range(self.number_of_processes)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def solve(self, main_hand, face_hand=(), partial_flop=(), dead_cards=()):
+        """
+        Hero (win, lose, tie) counts of main_hand against face_hand, or against any
+        remaining holding when face_hand is empty, over every board completing partial_flop
+        without dead_cards
+        """
+        deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+        dead_cards = tuple(map(to_int, dead_cards))
+        if len(main_hand) != 2 or len(face_hand) not in (0, 2) or len(partial_flop) > 5:
+            raise ValueError("Expected 2 cards hands and at most 5 board cards")
+
+        self.stats["requests"] += 1
+        key = matchup_key(main_hand, face_hand, partial_flop, deck)
+        task = self.inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._compute(main_hand, face_hand, partial_flop, dead_cards, deck))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # a requester going away does not cancel the others waiting on the same matchup
+        return await asyncio.shield(task)
+
+    async def _compute(self, main_hand, face_hand, partial_flop, dead_cards, deck):
+        loop = asyncio.get_running_loop()
+        boards = math.comb(len(deck), 5 - len(partial_flop))
+        if face_hand and boards <= BATCH_BOARDS:
+            return await self._batched(main_hand, face_hand, partial_flop, dead_cards)
+        number_of_chunks = self.number_of_processes * CHUNKS_PER_PROCESS if boards > BATCH_BOARDS else 1
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, solve_exact, main_hand, face_hand, partial_flop, deck,
+                                 chunk, number_of_chunks)
+            for chunk in range(number_of_chunks)))
+        return tuple(map(sum, zip(*results)))
+
+    async def _batched(self, main_hand, face_hand, partial_flop, dead_cards):
+        loop = asyncio.get_running_loop()
+        batch_key = tuple(sorted(partial_flop)), tuple(sorted(dead_cards))
+        batch = self.pending.get(batch_key)
+        if batch is None:
+            batch = self.pending[batch_key] = []
+            loop.call_later(self.batch_window, self._flush, batch_key)
+        future = loop.create_future()
+        batch.append(((main_hand, face_hand), future))
+        return await future
+
+    def _flush(self, batch_key):
+        batch = self.pending.pop(batch_key)
+        self.stats["batches"] += 1
+        self.stats["batched"] += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            done = loop.run_in_executor(self.executor, solve_batch, *batch_key, [matchup for matchup, _ in batch])
+        except Exception as e:
+            # a broken pool refuses the submission at once, the loop would only log it
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        def dispatch(done):
+            error = asyncio.CancelledError() if done.cancelled() else done.exception()
+            results = done.result() if error is None else [None] * len(batch)
+            for (_, future), counts in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(counts)
+        done.add_done_callback(dispatch)
+
+    async def handle(self, reader, writer):
+        """
+        Answer the requests of a connection, each one in its own task
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def answer(line):
+            request = {}
+            try:
+                request = json.loads(line)
+                response = {"id": request.get("id")}
+                if request.get("op") == "stats":
+                    response.update(self.stats)
+                else:
+                    win, lose, tie = await self.solve(
+                        request["main"], request.get("face") or (), request.get("board") or (),
+                        request.get("dead") or ())
+                    total = win + lose + tie
+                    response.update(win=win, lose=lose, tie=tie, equity=(win + tie / 2) / total)
+            except Exception as e:
+                # any failure, a broken pool included, is answered so that no client waits
+                # forever; cancellation is a BaseException and goes through
+                self.stats["errors"] += 1
+                response = {"id": request.get("id") if isinstance(request, dict) else None,
+                            "error": "{}: {}".format(type(e).__name__, e)}
+
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        await self.start()
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        print("Serving on", path or "{}:{}".format(host, port), "with", self.number_of_processes, "processes")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+class SolverClient:
+    """
+    Blocking client of a SolverServer, one request at a time
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, path=None, timeout=None):
+        if path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection((host, port), timeout)
+        self.file = self.sock.makefile("rwb")
+        self.next_id = 0
+
+    def request(self, request: dict) -> dict:
+        self.next_id += 1
+        request = dict(request, id=self.next_id)
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response
+
+    def solve(self, main_hand, face_hand=(), partial_flop=(), dead_cards=()) -> dict:
+        return self.request({"main": list(main_hand), "face": list(face_hand), "board": list(partial_flop),
+                             "dead": list(dead_cards)})
+
+    def stats(self) -> dict:
+        return self.request({"op": "stats"})
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="poker_solver server and client")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the server")
+    serve_parser.add_argument("--processes", type=int, default=None)
+    query_parser = commands.add_parser("query", help="solve a matchup on a running server")
+    query_parser.add_argument("main", help="comma separated cards, like AC,QH")
+    query_parser.add_argument("face", nargs="?", default="", help="opponent cards, unknown when omitted")
+    query_parser.add_argument("--board", default="")
+    query_parser.add_argument("--dead", default="", help="comma separated dead cards")
+    stats_parser = commands.add_parser("stats", help="print the counters of a running server")
+    for command in (serve_parser, query_parser, stats_parser):
+        command.add_argument("--host", default="127.0.0.1")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT)
+        command.add_argument("--unix", default=None, help="Unix socket path, instead of TCP")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(SolverServer(args.processes).serve(args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    with SolverClient(args.host, args.port, args.unix) as client:
+        if args.command == "stats":
+            print(client.stats())
+        else:
+            cards = lambda text: [card for card in text.split(",") if card]
+            print(client.solve(cards(args.main), cards(args.face), cards(args.board), cards(args.dead)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,38 @@
 #! /usr/bin/python
 
+import os
 import sys
+import mmap
 import time
 import math
+import random
+import tempfile
 
+from array import array
 from enum import Enum
-from copy import deepcopy
 from typing import Tuple
-from itertools import combinations, combinations_with_replacement
+from itertools import (
+    accumulate, chain, combinations, combinations_with_replacement, groupby, islice, permutations, product)
 
-from multiprocessing import Lock, Process, Queue, current_process, cpu_count
+from multiprocessing import Array, Lock, Pool, Process, Queue, current_process, cpu_count
 # print("Number of cpu : ", cpu_count())
 import queue # imported for using queue.Empty exception
+import sqlite3
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import lru_cache
 
 # import platform
 # print(platform.python_version())
 
-from pydealer import Deck
+try:
+    import numpy as np
+except ImportError: # numpy is only needed by the batch mode
+    np = None
+
 from pydealer.card import Card
 from pydealer.const import (
     DEFAULT_RANKS,
@@ -110,6 +126,96 @@ class MyCard(Card):
         return("{}{}".format(VALEUR[self.value], COLOR[self.suit]))
 
 
+# Integer encoding of the cards used by the solvers, card = suit * 13 + value with value
+# the index in VALUES (2 to Ace) and suit the index in SUITS. MyCard is only used to
+# parse the inputs and print the outputs.
+MYCARDS = [MyCard(value, suit) for suit in SUITS for value in VALUES]
+CARD_INDEX = {card.name: card_int for card_int, card in enumerate(MYCARDS)}
+FULL_MASK = (1 << 52) - 1
+
+
+def to_int(card) -> int:
+    """
+    Integer encoding of a MyCard or of its short name ("AC", "TH", ...)
+    """
+    if isinstance(card, int):
+        return card
+    if isinstance(card, str):
+        card = MyCard(card)
+    return CARD_INDEX[card.name]
+
+
+def to_card(card: int) -> MyCard:
+    """
+    MyCard of an integer card, for printing purpose
+    """
+    return MYCARDS[card]
+
+
+def cards_str(cards) -> str:
+    return " ".join(str(MYCARDS[card]) for card in cards)
+
+
+class IntDeck:
+    """
+    Deck of integer cards backed by an array and the 52 bits mask of its cards
+    """
+    __slots__ = ("cards", "mask")
+
+    def __init__(self, mask: int = FULL_MASK):
+        self.mask = mask
+        self.cards = array("B", (card for card in range(52) if mask >> card & 1))
+
+    def get(self, card) -> int:
+        """
+        Remove a card (MyCard, short name or integer) from the deck and return its integer
+        """
+        if not isinstance(card, int):
+            card = to_int(card)
+        if not self.mask >> card & 1:
+            raise ValueError("Card {} is not in the deck".format(MYCARDS[card].name))
+        self.mask &= ~(1 << card)
+        self.cards.remove(card)
+        return card
+
+    def remove(self, cards) -> tuple:
+        """
+        Remove several cards (dead cards) from the deck at once, filtering it by their mask,
+        and return their integers
+        """
+        cards = tuple(card if isinstance(card, int) else to_int(card) for card in cards)
+        mask = 0
+        for card in cards:
+            if not (self.mask & ~mask) >> card & 1:
+                raise ValueError("Card {} is not in the deck".format(MYCARDS[card].name))
+            mask |= 1 << card
+        self.mask &= ~mask
+        self.cards = array("B", (card for card in self.cards if not mask >> card & 1))
+        return cards
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __contains__(self, card):
+        return bool(self.mask >> card & 1)
+
+
+def deal(main_hand=(), face_hand=(), partial_flop=(), dead_cards=()):
+    """
+    (deck, main_hand, face_hand, partial_flop) as integer cards, the cards of both hands and
+    of the board being taken from a new IntDeck and dead_cards removed from it
+    """
+    deck = IntDeck()
+    main_hand = tuple(map(deck.get, main_hand))
+    face_hand = tuple(map(deck.get, face_hand))
+    partial_flop = tuple(map(deck.get, partial_flop))
+    deck.remove(dead_cards)
+    return deck, main_hand, face_hand, partial_flop
+
+
 class ProgressBar:
     def __init__(self, width, sleep=0):
         self.progress = 0
@@ -125,9 +231,9 @@ class ProgressBar:
         # sys.stdout.write("\b" * (toolbar_width*2)) # return to start of line, after '['
         # print("\b" * (self.width+20), flush=True)
 
-    def update(self):
+    def update(self, step=1):
         if self.progress < self.width:
-            self.progress += 1
+            self.progress = min(self.progress + step, self.width)
         self.toolbar_progress = self.progress * self.toolbar_width // self.width
         time.sleep(self.sleep)
 
@@ -140,12 +246,131 @@ class ProgressBar:
         # print("\b" * (self.width+20), flush=True)
 
 
+PROGRESS_BATCH = 1 << 12
+
+
+class SolveProgress:
+    """
+    Counters of a running solve, fed by the solvers once per batch of boards or per chunk:
+    boards counted with their weight, hand evaluations, (win, lose, tie) counts so far, and
+    boards, evaluations and CPU time of each worker process
+    """
+    def __init__(self, total=0):
+        self.total = total
+        self.boards = 0
+        self.evaluations = 0
+        self.counts = [0, 0, 0]
+        self.workers = {}
+        self.t0, self.cpu0 = time.time(), time.process_time()
+
+    def add(self, counts, evaluations, boards=None, worker=None, cpu_time=None):
+        boards = sum(counts) if boards is None else boards
+        self.boards += boards
+        self.evaluations += evaluations
+        for i, count in enumerate(counts):
+            self.counts[i] += count
+        if worker is not None:
+            stats = self.workers.setdefault(worker, [0, 0, 0.])
+            stats[0] += boards
+            stats[1] += evaluations
+            if cpu_time is not None:
+                stats[2] = cpu_time
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.t0
+
+    @property
+    def cpu_time(self) -> float:
+        """
+        CPU time of this process since the start, plus the one reported by the workers
+        """
+        return time.process_time() - self.cpu0 + sum(stats[2] for stats in self.workers.values())
+
+    def throughput(self) -> dict:
+        """
+        Evaluations per second of elapsed time of each worker, or of this process alone
+        """
+        elapsed = self.elapsed or 1e-9
+        if not self.workers:
+            return {current_process().name: self.evaluations / elapsed}
+        return {worker: stats[1] / elapsed for worker, stats in self.workers.items()}
+
+
+class ProgressObserver:
+    """
+    Observer of a solve, on_progress being called at most every interval seconds or every
+    `every` boards, whichever comes first, and on_finish once at the end. The solvers only
+    call update once per batch of boards, so that observing costs nothing per board.
+    This base class observes silently
+    """
+    def __init__(self, interval=1.0, every=None):
+        self.interval = interval
+        self.every = every
+        self._next_time = time.time() + interval if interval is not None else math.inf
+        self._next_boards = every if every is not None else math.inf
+
+    def update(self, progress: SolveProgress):
+        if progress.boards >= self._next_boards or time.time() >= self._next_time:
+            if self.interval is not None:
+                self._next_time = time.time() + self.interval
+            if self.every is not None:
+                self._next_boards = progress.boards + self.every
+            self.on_progress(progress)
+
+    def on_progress(self, progress: SolveProgress):
+        pass
+
+    def on_finish(self, progress: SolveProgress):
+        pass
+
+
+class BarObserver(ProgressObserver):
+    """
+    Draw a ProgressBar of the boards evaluated
+    """
+    def __init__(self, interval=0.2, every=None):
+        super().__init__(interval, every)
+        self.bar = None
+
+    def on_progress(self, progress):
+        if self.bar is None:
+            self.bar = ProgressBar(progress.total or 1)
+        self.bar.update(progress.boards - self.bar.progress)
+
+    def on_finish(self, progress):
+        self.on_progress(progress)
+        print()
+
+
+class StatsObserver(ProgressObserver):
+    """
+    Print the counts so far, the evaluations throughput and the elapsed and CPU times
+    """
+    def on_progress(self, progress):
+        main_count, face_count, null_count = progress.counts
+        print("{}/{}) {} {} {} {:.2f}%   {:.0f} evals/s   {:.2f}s (CPU {:.2f}s)".format(
+            progress.boards, progress.total,
+            main_count, face_count, null_count,
+            main_count / max(main_count + face_count, 1) * 100,
+            progress.evaluations / (progress.elapsed or 1e-9),
+            progress.elapsed, progress.cpu_time))
+
+    def on_finish(self, progress):
+        self.on_progress(progress)
+        for worker, throughput in progress.throughput().items():
+            print("  {}: {:.0f} evals/s".format(worker, throughput))
+
+
 class CustomWorker():
     def __init__(self, main_hand, face_hand, partial_flop):
         self.main_hand = main_hand
         self.face_hand = face_hand
         self.partial_flop = partial_flop
 
+        self.main_key, self.main_mask = hand_key(main_hand + partial_flop)
+        self.face_key, self.face_mask = hand_key(face_hand + partial_flop)
+
         self.main_count = 0
         self.face_count = 0
         self.null_count = 0
@@ -162,11 +387,9 @@ class CustomWorker():
             except queue.Empty:
                 break
             else:
-                full_flop = flop + self.partial_flop
-                main_full_flop = full_flop + self.main_hand
-                face_full_flop = full_flop + self.face_hand
-                main_value = max(map(weigh_hand, combinations(main_full_flop, 5)))
-                face_value = max(map(weigh_hand, combinations(face_full_flop, 5)))
+                key, mask = hand_key(flop)
+                main_value = weigh_key(self.main_key + key, self.main_mask | mask)
+                face_value = weigh_key(self.face_key + key, self.face_mask | mask)
                 if main_value > face_value:
                     self.main_count += 1
                 elif main_value < face_value:
@@ -237,184 +460,1504 @@ def weigh_hand(cards: Tuple[MyCard, MyCard, MyCard, MyCard, MyCard]) -> int:
     # print(" ".join(map(str, cards)), values_cards, values_count, "value=", value)
     return value
 
-def poker_solve() -> None:
-    cards = [MyCard(value, suit) for value in VALUES for suit in SUITS]
-    # deck = Deck(cards=[MyCard(value, suit) for value in VALUES for suit in SUITS])
-    deck = Deck(cards=cards, build=False)
-    deck.shuffle() 
 
-    main_hand = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["AC", "QH"]))
+# Lookup tables of the single pass evaluator. A set of cards is summarised by the
+# sum of RANK_KEY over its values and by one 13 bits mask of values per suit.
+# RANK_TABLE gives the best non flush weigh_hand score of a 5 to 7 values multiset,
+# indexed directly by its key, FLUSH_TABLE the best flush score of a suit mask.
+# RANK_KEY is the greedy smallest increasing set whose sums are distinct over the
+# 5, 6 and 7 values multisets (a zero key value used at most twice standing for
+# the missing cards), keeping the table to 15.8M 16 bits entries.
+RANK_KEY = [1, 4, 16, 67, 295, 1334, 5734, 23800, 60883, 208450, 509982, 1304151, 2967844]
+RANK_TABLE_SIZE = 4 * RANK_KEY[12] + 3 * RANK_KEY[11] + 1
+HAUTEUR2_INDEX = {h: i for i, h in enumerate(HAUTEUR2)}
+HAUTEUR3_INDEX = {h: i for i, h in enumerate(HAUTEUR3)}
+HAUTEUR5_INDEX = {h: i for i, h in enumerate(HAUTEUR5)}
+# Straight masks from the highest (Ace to Ten) to the lowest (Five to Ace) with their low value
+STRAIGHT_MASKS = [(0x1F << (low - 1), low) for low in range(9, 0, -1)] + [(0x100F, 0)]
+
+
+def _straight_low(mask: int) -> int:
+    """
+    Return the low value of the best straight of a values mask, 0 for the wheel and -1 if none
+    """
+    for straight, low in STRAIGHT_MASKS:
+        if mask & straight == straight:
+            return low
+    return -1
+
+
+def _weigh_ranks(values_cards) -> int:
+    """
+    Best weigh_hand score of a values multiset (sorted in reverse order), suits being ignored
+    """
+    counts = {}
+    for value in values_cards:
+        counts[value] = counts.get(value, 0) + 1
+    quads = [v for v, c in counts.items() if c == 4]
+    trips = [v for v, c in counts.items() if c == 3]
+    pairs = [v for v, c in counts.items() if c == 2]
+
+    if quads:
+        kicker = max(v for v in values_cards if v != quads[0])
+        return 11000 + quads[0] * 15 + kicker - 1
+    if trips and len(trips) + len(pairs) > 1:
+        pair = max(trips[1:] + pairs)
+        return 10500 + trips[0] * 15 + pair
+
+    low = _straight_low(sum(1 << (v - 1) for v in counts))
+    if low >= 0:
+        return 9000 + low
+
+    if trips:
+        kickers = tuple(v for v in values_cards if v != trips[0])[:2]
+        return 7500 + trips[0] * 80 + HAUTEUR2_INDEX[kickers]
+    if len(pairs) > 1:
+        max_pair, min_pair = pairs[:2]
+        kicker = max(v for v in values_cards if v not in (max_pair, min_pair))
+        return 6000 + HAUTEUR2_INDEX[(max_pair, min_pair)] * 15 + kicker - 1
+    if pairs:
+        kickers = tuple(v for v in values_cards if v != pairs[0])[:3]
+        return 1500 + pairs[0] * 300 + HAUTEUR3_INDEX[kickers]
+    return HAUTEUR5_INDEX[tuple(values_cards[:5])]
+
+
+def _weigh_flush(mask: int) -> int:
+    """
+    Best weigh_hand score of a suit mask holding at least 5 values, 0 otherwise
+    """
+    values_cards = [v for v in range(13, 0, -1) if mask >> (v - 1) & 1]
+    if len(values_cards) < 5:
+        return 0
+    low = _straight_low(mask)
+    if low >= 0:
+        return 12000 + low
+    return 9100 + HAUTEUR5_INDEX[tuple(values_cards[:5])]
+
+
+def _build_rank_table() -> array:
+    table = array("H", bytes(2 * RANK_TABLE_SIZE))
+    for size in (5, 6, 7):
+        for values_cards in combinations_with_replacement(range(13, 0, -1), size):
+            if any(values_cards[i] == values_cards[i + 4] for i in range(size - 4)):
+                continue
+            table[sum(RANK_KEY[v - 1] for v in values_cards)] = _weigh_ranks(values_cards)
+    return table
+
+
+# The tables are kept in a file mapped read only by every process, so that workers share
+# a single copy of them instead of building their own: the first process to import the
+# module writes it, the others map it. The file is TABLES_PATH in the temporary directory,
+# named after the user id so that users sharing /tmp each get their own, unless
+# POKER_SOLVER_TABLES names another one, an empty POKER_SOLVER_TABLES keeping the tables in
+# memory.
+TABLES_MAGIC = b"PKSTBL01"
+TABLES_PATH = os.path.join(tempfile.gettempdir(), "poker_solver_tables_{}_{}_{}.bin".format(
+    os.getuid() if hasattr(os, "getuid") else "user", TABLES_MAGIC[-2:].decode(), RANK_TABLE_SIZE))
+
+
+def save_tables(path, rank_table, flush_table):
+    """
+    Write the tables to path for load_tables, through a temporary file renamed at the end
+    """
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as f:
+        f.write(TABLES_MAGIC)
+        f.write(array("Q", [len(rank_table), len(flush_table)]).tobytes())
+        f.write(rank_table.tobytes())
+        f.write(flush_table.tobytes())
+    os.replace(temporary, path)
+
+
+def load_tables(path):
+    """
+    Map a file of save_tables read only and return (rank_table, flush_table) memoryviews
+    over it, the pages being shared by every process mapping the same file
+    """
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    sizes = array("Q", data[8:24])
+    if data[:8] != TABLES_MAGIC or list(sizes) != [RANK_TABLE_SIZE, 1 << 13]:
+        raise ValueError("{} is not a tables file of this version".format(path))
+    view = memoryview(data)[24:].cast("H")
+    return view[:RANK_TABLE_SIZE], view[RANK_TABLE_SIZE:]
+
+
+def build_tables():
+    """
+    (RANK_TABLE, FLUSH_TABLE), mapped from the tables file, which is written first when
+    missing or not of this version. They are built in memory when the file is disabled or
+    cannot be written, and when it belongs to another user
+    """
+    path = os.environ.get("POKER_SOLVER_TABLES", TABLES_PATH)
+    if path and os.path.exists(path):
+        try:
+            if hasattr(os, "getuid") and os.stat(path).st_uid != os.getuid():
+                path = None
+            else:
+                return load_tables(path)
+        except (OSError, ValueError):
+            pass
+    rank_table = _build_rank_table()
+    flush_table = array("H", [_weigh_flush(mask) for mask in range(1 << 13)])
+    if path:
+        try:
+            save_tables(path, rank_table, flush_table)
+            return load_tables(path)
+        except OSError:
+            pass
+    return rank_table, flush_table
+
+
+RANK_TABLE, FLUSH_TABLE = build_tables()
+
+
+# Per card lookups of the integer encoding: a set of cards is summarised by the sum of
+# its CARD_KEY (values key in the low bits, one 4 bits count per suit from SUIT_SHIFT)
+# and by its 52 bits mask, both being additive for disjoint sets of cards.
+SUIT_SHIFT = 32
+RANK_KEY_MASK = (1 << SUIT_SHIFT) - 1
+FLUSH_CHECK = 0x3333
+CARD_KEY = [RANK_KEY[card % 13] + (1 << (SUIT_SHIFT + 4 * (card // 13))) for card in range(52)]
+CARD_MASK = [1 << card for card in range(52)]
+
+
+def hand_key(cards) -> Tuple[int, int]:
+    """
+    Return the (key, mask) summary of integer cards
+    """
+    return sum(map(CARD_KEY.__getitem__, cards)), sum(map(CARD_MASK.__getitem__, cards))
+
+
+def cards_mask(cards) -> int:
+    return sum(map(CARD_MASK.__getitem__, cards))
+
+
+def weigh_key(key: int, mask: int) -> int:
+    """
+    Score of the best 5 cards hand of a (key, mask) summary of 5 to 7 cards
+    """
+    value = RANK_TABLE[key & RANK_KEY_MASK]
+    flush = (key >> SUIT_SHIFT) + FLUSH_CHECK & 0x8888
+    if flush:
+        suit = (flush.bit_length() >> 2) - 1
+        return max(value, FLUSH_TABLE[mask >> (13 * suit) & 0x1FFF])
+    return value
+
+
+def weigh_best_hand(cards) -> int:
+    """
+    Score of the best 5 cards hand among 5 to 7 integer cards, equal to
+    max(map(weigh_hand, combinations(cards, 5))) on the matching MyCard
+    """
+    return weigh_key(*hand_key(cards))
+
+
+# weigh_hand scores lie in one band per hand category, from high card to straight flush
+HAND_CATEGORIES = ("high card", "pair", "two pair", "trips", "straight", "flush", "full house", "quads",
+                   "straight flush")
+CATEGORY_BANDS = (0, 1500, 6000, 7500, 9000, 9100, 10500, 11000, 12000)
+SCORE_CATEGORY = bytes(bisect_right(CATEGORY_BANDS, score) - 1 for score in range(12010))
+# hero then opponent, each category holding the (win, lose, tie) weights of that player
+CATEGORY_COUNTERS = 2 * len(HAND_CATEGORIES) * 3
+FACE_CATEGORIES = len(HAND_CATEGORIES) * 3
+
+
+class HandCategories:
+    """
+    Weights of the boards (times the opponent holdings when unknown) by final hand category
+    of each player and by outcome from that player side, filled by the solvers in the same
+    pass as the counts. counts is the flat list of CATEGORY_COUNTERS weights: player, then
+    category (HAND_CATEGORIES order), then win, lose and tie
+    """
+    def __init__(self):
+        self.counts = [0] * CATEGORY_COUNTERS
+
+    def add(self, counts):
+        for i, count in enumerate(counts):
+            self.counts[i] += count
+
+    def outcomes(self, player=0) -> dict:
+        """
+        {category: (win, lose, tie)} of the hero (player 0) or of the opponent (player 1)
+        """
+        offset = player * FACE_CATEGORIES
+        return {name: tuple(self.counts[offset + 3 * i:offset + 3 * i + 3])
+                for i, name in enumerate(HAND_CATEGORIES)}
+
+    def histogram(self, player=0) -> dict:
+        """
+        {category: weight} of the final hands of the hero (player 0) or of the opponent (player 1)
+        """
+        return {name: sum(counts) for name, counts in self.outcomes(player).items()}
+
+    def print(self):
+        total = sum(self.counts[:FACE_CATEGORIES]) or 1
+        print("{:<16}{:>26}{:>26}".format("", "hero", "villain"))
+        for name, main, face in zip(HAND_CATEGORIES, self.outcomes(0).values(), self.outcomes(1).values()):
+            print("{:<16}{:>10} {:>6.2f}% {:>5.1f}%w{:>10} {:>6.2f}% {:>5.1f}%w".format(
+                name,
+                sum(main), sum(main) / total * 100, main[0] / max(sum(main), 1) * 100,
+                sum(face), sum(face) / total * 100, face[0] / max(sum(face), 1) * 100))
+
+
+def face_histogram(board_key: int, board_mask: int, value_counts, faces_mask: int) -> dict:
+    """
+    Histogram {score: number of holdings} of every 2 cards holding taken among the cards of
+    faces_mask (value_counts giving their number by value) with the 5 cards board summary.
+    Holdings are ranked by pair of values, only the ones able to make a flush being ranked
+    one by one.
+    """
+    histogram = {}
+    rank_key = board_key & RANK_KEY_MASK
+    for value1 in range(13):
+        count1 = value_counts[value1]
+        if not count1:
+            continue
+        key1 = rank_key + RANK_KEY[value1]
+        if count1 > 1:
+            score = RANK_TABLE[key1 + RANK_KEY[value1]]
+            histogram[score] = histogram.get(score, 0) + count1 * (count1 - 1) // 2
+        for value2 in range(value1 + 1, 13):
+            count2 = value_counts[value2]
+            if count2:
+                score = RANK_TABLE[key1 + RANK_KEY[value2]]
+                histogram[score] = histogram.get(score, 0) + count1 * count2
+
+    suit_counts = board_key >> SUIT_SHIFT
+    for suit in range(4):
+        if suit_counts >> (4 * suit) & 0xF >= 3:
+            break
+    else:
+        return histogram
+    board_suit = board_mask >> (13 * suit) & 0x1FFF
+    board_suited = suit_counts >> (4 * suit) & 0xF
+    suited = [card for card in range(13 * suit, 13 * suit + 13) if faces_mask >> card & 1]
+    holdings = combinations(suited, 2)
+    if board_suited > 3:
+        others = [card for card in range(52) if faces_mask >> card & 1 and card // 13 != suit]
+        holdings = chain(holdings, product(suited, others))
+        if board_suited > 4:
+            holdings = chain(holdings, combinations(others, 2))
+    for card1, card2 in holdings:
+        score = RANK_TABLE[rank_key + RANK_KEY[card1 % 13] + RANK_KEY[card2 % 13]]
+        flush = FLUSH_TABLE[board_suit | (CARD_MASK[card1] | CARD_MASK[card2]) >> (13 * suit) & 0x1FFF]
+        if flush > score:
+            histogram[score] -= 1
+            histogram[flush] = histogram.get(flush, 0) + 1
+    return histogram
+
+
+def suit_blocks(*masks):
+    """
+    Groups of interchangeable suits, holding the same values in every given cards mask.
+    Any permutation of the suits inside the blocks leaves those masks unchanged.
+    """
+    profiles = {}
+    for suit in range(4):
+        profile = tuple(mask >> (13 * suit) & 0x1FFF for mask in masks)
+        profiles.setdefault(profile, []).append(suit)
+    return [tuple(block) for block in profiles.values() if len(block) > 1]
+
+
+def canonical_matchup(*masks) -> Tuple[int, ...]:
+    """
+    Canonical form of cards masks under suit symmetry: the suits are reordered by their
+    values in every mask, so matchups equal up to a permutation of suits share the same form
+    """
+    profiles = sorted(tuple(mask >> (13 * suit) & 0x1FFF for mask in masks) for suit in range(4))
+    return tuple(sum(profile[i] << (13 * suit) for suit, profile in enumerate(profiles)) for i in range(len(masks)))
+
+
+def _partitions(size, parts, top):
+    """
+    Yield the non increasing tuples of parts integers lower or equal to top summing to size
+    """
+    if not parts:
+        if not size:
+            yield ()
+        return
+    for first in range(min(size, top), -1, -1):
+        if first * parts < size:
+            break
+        for rest in _partitions(size - first, parts - 1, first):
+            yield (first,) + rest
+
+
+def _group_boards(cards_by_suit, group, size):
+    """
+    Yield (cards, weight) for one draw of size cards of each class of draws among the
+    interchangeable suits of group, weight being the number of draws of its class
+    """
+    values = [card % 13 for card in cards_by_suit[group[0]]]
+    for parts in _partitions(size, len(group), len(values)):
+        runs = [(count, len(list(run))) for count, run in groupby(parts)]
+        for chosen in product(*[
+                combinations_with_replacement(list(combinations(values, count)), repeat)
+                for count, repeat in runs]):
+            subsets = [subset for run in chosen for subset in run]
+            cards = tuple(13 * suit + value for suit, subset in zip(group, subsets) for value in subset)
+            weight = math.factorial(len(group))
+            for subset in set(subsets):
+                weight //= math.factorial(subsets.count(subset))
+            yield cards, weight
+
+
+def combinations_slice(pool, size, start=0, stop=None):
+    """
+    Yield combinations(pool, size)[start:stop], unranking start through the number of
+    combinations of each leading card instead of enumerating the combinations before it
+    """
+    pool = tuple(pool)
+    stop = math.comb(len(pool), size) if stop is None else stop
+    if not size:
+        if start <= 0 < stop:
+            yield ()
+        return
+    for i in range(len(pool) - size + 1):
+        if stop <= 0:
+            return
+        block = math.comb(len(pool) - i - 1, size - 1)
+        if start < block:
+            head = pool[i:i + 1]
+            if start <= 0 and stop >= block:
+                for tail in combinations(pool[i + 1:], size - 1):
+                    yield head + tail
+            else:
+                for tail in combinations_slice(pool[i + 1:], size - 1, start, stop):
+                    yield head + tail
+        start, stop = max(start - block, 0), stop - block
+
+
+def _iso_draws(deck, size, blocks):
+    """
+    Draws lists of each group of suits (blocks then single suits), for every way to split
+    size cards among the groups, the boards of iso_boards being their products in order.
+    The lists are shared by the calls on the same deck, so that the chunks of a solve
+    handled by a worker build them once
+    """
+    return _deck_draws(deck.mask, size, tuple(map(tuple, blocks)))
+
+
+@lru_cache(maxsize=4)
+def _deck_draws(deck_mask, size, blocks):
+    cards_by_suit = [[card for card in range(13 * suit, 13 * suit + 13) if deck_mask >> card & 1]
+                     for suit in range(4)]
+    grouped = set(chain.from_iterable(blocks))
+    groups = list(blocks) + [(suit,) for suit in range(4) if suit not in grouped]
+    draws = [[list(_group_boards(cards_by_suit, group, count)) for count in range(size + 1)] for group in groups]
+    return [[group_draws[count] for group_draws, count in zip(draws, counts)]
+            for counts in product(range(size + 1), repeat=len(groups)) if sum(counts) == size]
+
+
+def iso_count(deck, size, blocks) -> int:
+    """
+    Number of boards yielded by iso_boards
+    """
+    if not blocks:
+        return math.comb(len(deck), size)
+    return sum(math.prod(map(len, lists)) for lists in _iso_draws(deck, size, blocks))
+
+
+def iso_boards(deck, size, blocks, start=0, stop=None):
+    """
+    Yield (board, weight) for one board of each class of boards identical up to a permutation
+    of the suits inside blocks, weight being the number of boards of its class. Boards are
+    built suit group by suit group so that only one board per class is ever generated.
+    start and stop slice the yielded boards, whole products of draws being skipped at once.
+    """
+    if not blocks:
+        for board in combinations_slice(deck, size, start, stop):
+            yield board, 1
+        return
+    for lists in _iso_draws(deck, size, blocks):
+        if stop is not None and stop <= 0:
+            return
+        *heads, last = lists
+        total = math.prod(map(len, lists))
+        if start < total:
+            first, offset = divmod(start, len(last))
+            for index, head_draws in enumerate(islice(product(*heads), first, None), first):
+                low = index * len(last)
+                if stop is not None and stop <= low:
+                    break
+                head = tuple(chain.from_iterable(cards for cards, _ in head_draws))
+                head_weight = math.prod(weight for _, weight in head_draws)
+                end = len(last) if stop is None else min(len(last), stop - low)
+                for cards, weight in last[offset if index == first else 0:end]:
+                    yield head + cards, head_weight * weight
+        start = max(start - total, 0)
+        if stop is not None:
+            stop -= total
+
+
+# Numpy views of the lookup tables for the batch mode, sharing their memory
+NUMPY_CHUNK_SIZE = 1 << 16
+if np is not None:
+    NP_RANK_TABLE = np.frombuffer(RANK_TABLE, dtype=np.uint16)
+    NP_FLUSH_TABLE = np.frombuffer(FLUSH_TABLE, dtype=np.uint16)
+    NP_CARD_KEY = np.array([key & RANK_KEY_MASK for key in CARD_KEY], dtype=np.int64)
+    NP_CARD_MASK = np.array(CARD_MASK, dtype=np.int64)
+
+
+def weigh_key_numpy(key, mask):
+    """
+    Vectorized weigh_key over arrays of values keys (without suit counts) and 52 bits masks
+    """
+    value = NP_RANK_TABLE[key].astype(np.int32)
+    for suit in range(4):
+        np.maximum(value, NP_FLUSH_TABLE[mask >> (13 * suit) & 0x1FFF], out=value)
+    return value
+
+
+class EquityCache:
+    """
+    Cache of (win, lose, tie) counts keyed by canonical matchup (see canonical_matchup),
+    a bounded in memory LRU in front of a sqlite file shared by the processes
+    """
+    def __init__(self, path="poker_solver_cache.sqlite", size=4096):
+        self.path = path
+        self.size = size
+        self.lru = OrderedDict()
+        self.memory_hits, self.disk_hits, self.misses = 0, 0, 0
+
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS equity ("
+            "main INTEGER, face INTEGER, flop INTEGER, deck INTEGER, "
+            "win INTEGER, lose INTEGER, tie INTEGER, "
+            "PRIMARY KEY (main, face, flop, deck)) WITHOUT ROWID")
+        self.connection.commit()
+
+    def _remember(self, key, counts):
+        self.lru[key] = counts
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.size:
+            self.lru.popitem(last=False)
+
+    def get(self, key):
+        """
+        Return the cached counts of a canonical matchup key, None if unknown
+        """
+        counts = self.lru.get(key)
+        if counts is not None:
+            self.memory_hits += 1
+            self.lru.move_to_end(key)
+            return counts
+        row = self.connection.execute(
+            "SELECT win, lose, tie FROM equity WHERE main=? AND face=? AND flop=? AND deck=?", key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        counts = tuple(row)
+        self._remember(key, counts)
+        return counts
+
+    def put(self, key, counts):
+        counts = tuple(counts)
+        self._remember(key, counts)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO equity VALUES (?, ?, ?, ?, ?, ?, ?)", key + counts)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / (hits + self.misses) if hits + self.misses else 0.,
+            "memory_size": len(self.lru),
+        }
+
+    def close(self):
+        self.connection.close()
+
+
+def matchup_key(main_hand, face_hand, partial_flop, deck) -> Tuple[int, int, int, int]:
+    """
+    EquityCache key of a matchup, the deck holding the remaining cards
+    """
+    return canonical_matchup(cards_mask(main_hand), cards_mask(face_hand), cards_mask(partial_flop), deck.mask)
+
+
+def print_counts(main_count, face_count, null_count, len_combi) -> None:
+    print("{} {} {} {:.2f}     {:.2f}% {:.2f}% {:.2f}%".format(
+        main_count,
+        face_count,
+        len_combi - main_count - face_count,
+        main_count / (main_count + face_count) * 100,
+        main_count / len_combi * 100,
+        face_count / len_combi * 100,
+        null_count / len_combi * 100))
+
+
+def poker_solve(cache: EquityCache = None, observer: ProgressObserver = None,
+                dead_cards=("8H", "5S", "6C", "4H", "6H", "5C", "JH", "2S")) -> list:
+    observer = observer if observer is not None else BarObserver()
+    deck = IntDeck()
+
+    main_hand = tuple(map(deck.get, ["AC", "QH"]))
     partial_flop = ()
-    partial_flop = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KH"]))
-    # partial_flop = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KH", "KD", "6S"]))
+    partial_flop = tuple(map(deck.get, ["KH"]))
+    # partial_flop = tuple(map(deck.get, ["KH", "KD", "6S"]))
 
-    # _ = deck.get(MyCard("KD").name)
-    # _ = deck.get(MyCard("3S").name)
+    # _ = deck.get("KD")
+    # _ = deck.get("3S")
     
-    face_cards = [tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["TC", "TH"]))]
+    face_cards = [tuple(map(deck.get, ["TC", "TH"]))]
     # face_cards = [combinations(deck, 2)]
-    droped_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["8H", "5S", "6C", "4H", "6H", "5C", "JH", "2S"]))
+    droped_card = deck.remove(dead_cards)
     
-    print(len(cards), len(deck))
+    print(len(MYCARDS), len(deck))
 
     # c1 = list(combinations(deck, 2))
     # print(c1[0], c1[1], c1[2])
     # print(len(c1))
+    results = []
+    main_key, main_mask = hand_key(main_hand + partial_flop)
     for face_card in face_cards:
-        tmp_deck = deepcopy(deck)
+        face_key, face_mask = hand_key(face_card + partial_flop)
+        blocks = suit_blocks(cards_mask(main_hand), cards_mask(face_card), cards_mask(partial_flop), deck.mask)
         # input()
         main_count, face_count, null_count = 0, 0, 0
-        len_combi = math.comb(len(tmp_deck), 5 - len(partial_flop))
+        len_combi = math.comb(len(deck), 5 - len(partial_flop))
 
-        print("{} {}  VS  {} {}   ({}, {})".format(
-            main_hand[0], main_hand[1],
-            face_card[0], face_card[1],
-            len(tmp_deck), len_combi))
+        print("{}  VS  {}   ({}, {})".format(
+            cards_str(main_hand),
+            cards_str(face_card),
+            len(deck), len_combi))
 
-        progress_bar = ProgressBar(len_combi)
-        main_count, face_count, null_count = 0, 0, 0
+        if cache is not None:
+            cache_key = matchup_key(main_hand, face_card, partial_flop, deck)
+            counts = cache.get(cache_key)
+            if counts is not None:
+                print_counts(*counts, len_combi)
+                results.append(counts)
+                continue
+
+        progress = SolveProgress(len_combi)
         t0 = time.time()
         t0b = time.process_time()
-        for i, flop in enumerate(combinations(tmp_deck, 5 - len(partial_flop))):
-            full_flop = flop + partial_flop
-            main_full_flop = full_flop + main_hand
-            face_full_flop = full_flop + face_card
+        boards = iso_boards(deck, 5 - len(partial_flop), blocks)
+        for batch in iter(lambda: list(islice(boards, PROGRESS_BATCH)), []):
+            main_count, face_count, null_count = 0, 0, 0
+            for flop, weight in batch:
+                key, mask = hand_key(flop)
+
+                main_value = weigh_key(main_key + key, main_mask | mask)
+                face_value = weigh_key(face_key + key, face_mask | mask)
+
+                if main_value > face_value:
+                    main_count += weight
+                elif main_value < face_value:
+                    face_count += weight
+                else:
+                    null_count += weight
+            progress.add((main_count, face_count, null_count), 2 * len(batch))
+            observer.update(progress)
+        main_count, face_count, null_count = progress.counts
+        observer.on_finish(progress)
+        print_counts(main_count, face_count, null_count, len_combi)
+        print("TIME=", time.time() - t0, time.process_time() - t0b)
+        # input()
+        if cache is not None:
+            cache.put(cache_key, (main_count, face_count, null_count))
+        results.append((main_count, face_count, null_count))
+    return results
+
+def iso_weights_numpy(mask, blocks):
+    """
+    Vectorized iso_boards weights of an array of boards masks, 0 for the boards not kept
+    """
+    weight = np.ones(len(mask), dtype=np.int64)
+    for block in blocks:
+        fields = [mask >> (13 * suit) & 0x1FFF for suit in block]
+        for a, b in zip(fields, fields[1:]):
+            weight[a < b] = 0
+        stabilizer = sum(
+            np.logical_and.reduce([fields[perm[i]] == fields[i] for i in range(len(block))])
+            for perm in permutations(range(len(block))))
+        weight *= math.factorial(len(block)) // stabilizer
+    return weight
+
+
+def poker_solve_numpy(main_hand, face_hand, partial_flop=(), chunk_size=NUMPY_CHUNK_SIZE,
+                      cache: EquityCache = None, dead_cards=()) -> Tuple[int, int, int]:
+    """
+    Batch version of poker_solve: every remaining board (without dead_cards) is ranked for
+    both hands with array passes over chunks of chunk_size boards, and (win, lose, tie)
+    counts are returned
+    """
+    if np is None:
+        raise ImportError("numpy is required by poker_solve_numpy")
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+    size = 5 - len(partial_flop)
+
+    if cache is not None:
+        cache_key = matchup_key(main_hand, face_hand, partial_flop, deck)
+        counts = cache.get(cache_key)
+        if counts is not None:
+            return counts
+
+    main_key, main_mask = hand_key(main_hand + partial_flop)
+    face_key, face_mask = hand_key(face_hand + partial_flop)
+    main_key &= RANK_KEY_MASK
+    face_key &= RANK_KEY_MASK
+    blocks = suit_blocks(cards_mask(main_hand), cards_mask(face_hand), cards_mask(partial_flop), deck.mask)
+
+    main_count, face_count, null_count = 0, 0, 0
+    boards = combinations(deck, size)
+    while True:
+        rows = list(islice(boards, chunk_size))
+        if not rows:
+            break
+        chunk = np.fromiter(chain.from_iterable(rows), dtype=np.intp, count=len(rows) * size)
+        chunk = chunk.reshape(len(rows), size)
+        key = NP_CARD_KEY[chunk].sum(axis=1)
+        mask = NP_CARD_MASK[chunk].sum(axis=1)
+        weight = None
+        if blocks:
+            weight = iso_weights_numpy(mask, blocks)
+            kept = weight > 0
+            key, mask, weight = key[kept], mask[kept], weight[kept]
+
+        main_value = weigh_key_numpy(key + main_key, mask | main_mask)
+        face_value = weigh_key_numpy(key + face_key, mask | face_mask)
+        if weight is None:
+            main_win = int(np.count_nonzero(main_value > face_value))
+            face_win = int(np.count_nonzero(main_value < face_value))
+            null_count += len(rows) - main_win - face_win
+        else:
+            main_win = int(weight[main_value > face_value].sum())
+            face_win = int(weight[main_value < face_value].sum())
+            null_count += int(weight.sum()) - main_win - face_win
+        main_count += main_win
+        face_count += face_win
+    if cache is not None:
+        cache.put(cache_key, (main_count, face_count, null_count))
+    return main_count, face_count, null_count
+
+
+MONTE_CARLO_BATCH = 1 << 15
 
-            main_value = max(map(weigh_hand, combinations(main_full_flop, 5)))
-            face_value = max(map(weigh_hand, combinations(face_full_flop, 5)))
 
+def _monte_carlo_batch(task) -> Tuple[int, int, int]:
+    """
+    Play batch_size random boards (and opponent hands when face_hand is empty) with the
+    random stream of (seed, worker, round_num), return the (win, lose, tie) counts
+    """
+    main_hand, face_hand, partial_flop, deck_cards, seed, worker, round_num, batch_size = task
+    size = 5 - len(partial_flop)
+    draw = size + (0 if face_hand else 2)
+    main_key, main_mask = hand_key(main_hand + partial_flop)
+    face_key, face_mask = hand_key(face_hand + partial_flop)
+
+    if np is None:
+        rng = random.Random("{}:{}:{}".format(seed, worker, round_num))
+        main_count, face_count, null_count = 0, 0, 0
+        for _ in range(batch_size):
+            drawn = rng.sample(deck_cards, draw)
+            key, mask = hand_key(drawn[:size])
+            main_value = weigh_key(main_key + key, main_mask | mask)
+            face_extra_key, face_extra_mask = hand_key(drawn[size:])
+            face_value = weigh_key(face_key + key + face_extra_key, face_mask | mask | face_extra_mask)
             if main_value > face_value:
                 main_count += 1
             elif main_value < face_value:
                 face_count += 1
             else:
                 null_count += 1
-                # print(" ".join(map(str, full_flop)))
-                # print(main_value, face_value)
-                # input()
-            progress_bar.update()
-
-            # if not i%200000 and i:
-            if not i%100000 and i:
-            # if True:
-                print()
-                print("{}) {} {} {} {:.2f}     {:.2f}% {:.2f}% {:.2f}%".format(
-                    i,
-                    main_count,
-                    face_count,
-                    len_combi - main_count - face_count,
-                    main_count / (main_count + face_count) * 100,
-                    main_count / len_combi * 100,
-                    face_count / len_combi * 100,
-                    null_count / len_combi * 100))
-                # input()
-                # pass
-        print()
-        print("{} {} {} {:.2f}     {:.2f}% {:.2f}% {:.2f}%".format(
-            main_count,
-            face_count,
-            len_combi - main_count - face_count,
-            main_count / (main_count + face_count) * 100,
-            main_count / len_combi * 100,
-            face_count / len_combi * 100,
-            null_count / len_combi * 100))
-        print("TIME=", time.time() - t0, time.process_time() - t0b)
-        # input()
+        return main_count, face_count, null_count
+
+    # Cards are drawn with replacement and the rows holding a card twice are rejected,
+    # leaving uniformly drawn rows of distinct cards
+    rng = np.random.default_rng([seed, worker, round_num])
+    cards = np.array(deck_cards, dtype=np.intp)
+    rows, count = [], 0
+    while count < batch_size:
+        drawn = rng.integers(0, len(cards), (batch_size, draw))
+        ordered = np.sort(drawn, axis=1)
+        drawn = drawn[(ordered[:, 1:] != ordered[:, :-1]).all(axis=1)]
+        rows.append(drawn)
+        count += len(drawn)
+    drawn = cards[np.concatenate(rows)[:batch_size]]
+
+    key = NP_CARD_KEY[drawn[:, :size]].sum(axis=1)
+    mask = NP_CARD_MASK[drawn[:, :size]].sum(axis=1)
+    main_value = weigh_key_numpy(key + (main_key & RANK_KEY_MASK), mask | main_mask)
+    face_key = key + (face_key & RANK_KEY_MASK) + NP_CARD_KEY[drawn[:, size:]].sum(axis=1)
+    face_mask = mask | face_mask | NP_CARD_MASK[drawn[:, size:]].sum(axis=1)
+    face_value = weigh_key_numpy(face_key, face_mask)
+    main_count = int(np.count_nonzero(main_value > face_value))
+    face_count = int(np.count_nonzero(main_value < face_value))
+    return main_count, face_count, batch_size - main_count - face_count
+
+
+def equity_error(main_count, face_count, null_count) -> Tuple[float, float]:
+    """
+    Equity (ties counting half) of sampled counts and its standard error
+    """
+    samples = main_count + face_count + null_count
+    equity = (main_count + null_count / 2) / samples
+    variance = (main_count + null_count / 4) / samples - equity ** 2
+    return equity, math.sqrt(max(variance, 0.) / samples)
+
+
+def poker_solve_monte_carlo(main_hand, face_hand=(), partial_flop=(), seed=0, precision=0.001,
+                            time_budget=None, max_samples=None, number_of_processes=1,
+                            batch_size=MONTE_CARLO_BATCH, z=1.96, verbose=False, dead_cards=()):
+    """
+    Sampling version of poker_solve: random boards (and random opponent hands when face_hand
+    is empty) without dead_cards are played by rounds of batch_size samples per process
+    until the confidence interval (z standard errors) is within precision, max_samples are
+    played or time_budget seconds are elapsed. Each batch has its own random stream derived
+    from (seed, process, round), so that a run stopped on precision or max_samples is
+    reproducible for a given seed and number of processes. Return (equity, standard error,
+    (win, lose, tie)).
+    """
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+    deck_cards = tuple(deck)
+
+    t0 = time.time()
+    main_count, face_count, null_count = 0, 0, 0
+    pool = Pool(number_of_processes) if number_of_processes > 1 else None
+    try:
+        round_num = 0
+        while True:
+            tasks = [(main_hand, face_hand, partial_flop, deck_cards, seed, worker, round_num, batch_size)
+                     for worker in range(number_of_processes)]
+            for m, f, n in (pool.map(_monte_carlo_batch, tasks) if pool else map(_monte_carlo_batch, tasks)):
+                main_count += m
+                face_count += f
+                null_count += n
+            round_num += 1
+
+            samples = main_count + face_count + null_count
+            equity, error = equity_error(main_count, face_count, null_count)
+            if verbose:
+                print("{}) {:.4f}% +- {:.4f}%".format(samples, equity * 100, z * error * 100))
+            if z * error <= precision \
+                    or (max_samples is not None and samples >= max_samples) \
+                    or (time_budget is not None and time.time() - t0 >= time_budget):
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return equity, error, (main_count, face_count, null_count)
+
+
+RANGE_VALUES = "23456789TJQKA"
+SUIT_LETTERS = "DCHS"
+
+
+def _range_hands(high: int, low: int, kind: str):
+    """
+    Combos of a pair (high == low), suited ("s"), offsuit ("o") or any ("") hand of values indexes
+    """
+    if high == low:
+        return list(combinations([13 * suit + high for suit in range(4)], 2))
+    hands = []
+    for suit1 in range(4):
+        for suit2 in range(4):
+            if (kind == "s" and suit1 != suit2) or (kind == "o" and suit1 == suit2):
+                continue
+            hands.append((13 * suit1 + high, 13 * suit2 + low))
+    return hands
+
+
+def _range_values(part: str, token: str):
+    """
+    (high, low, kind) of a "AKs", "AKo", "AK" or "TT" part of a range token, in either
+    order ("KAs" is "AKs"), raising ValueError on anything else
+    """
+    if not 2 <= len(part) <= 3 or part[0] not in RANGE_VALUES or part[1] not in RANGE_VALUES \
+            or part[2:] not in ("", "s", "o") or (part[0] == part[1] and part[2:]):
+        raise ValueError("Invalid range token {!r}".format(token))
+    high, low = sorted(map(RANGE_VALUES.index, part[:2]), reverse=True)
+    return high, low, part[2:]
+
+
+def _range_token(token: str):
+    """
+    Combos of a range token: "AKs", "AKo", "AK", "TT", "TT+", "AQs+", "KK-TT", "A5s-A2s" or "AcKd"
+    """
+    token = token.strip()
+    if len(token) == 4 and token[1].upper() in SUIT_LETTERS and token[3].upper() in SUIT_LETTERS:
+        if token[0].upper() not in RANGE_VALUES or token[2].upper() not in RANGE_VALUES:
+            raise ValueError("Invalid range token {!r}".format(token))
+        return [(to_int(token[:2].upper()), to_int(token[2:].upper()))]
+    if "-" in token:
+        first, _, last = token.partition("-")
+        high, low1, kind = _range_values(first, token)
+        last_high, low2, last_kind = _range_values(last, token)
+        if last_kind != kind or (high == low1) != (last_high == low2) or (high != low1 and last_high != high):
+            raise ValueError("Invalid range token {!r}".format(token))
+        if high == low1:
+            return [hand for pair in range(min(low1, low2), max(low1, low2) + 1)
+                    for hand in _range_hands(pair, pair, "")]
+        return [hand for low in range(min(low1, low2), max(low1, low2) + 1)
+                for hand in _range_hands(high, low, kind)]
+    plus = token.endswith("+")
+    high, low, kind = _range_values(token[:-1] if plus else token, token)
+    if not plus:
+        return _range_hands(high, low, kind)
+    if high == low:
+        return [hand for pair in range(high, 13) for hand in _range_hands(pair, pair, "")]
+    return [hand for kicker in range(low, high) for hand in _range_hands(high, kicker, kind)]
+
+
+def parse_range(hand_range) -> dict:
+    """
+    Weighted combos {(card, card): weight} of a range, either a string of tokens separated
+    by commas or spaces with an optional ":weight" suffix ("AQs+, KK, AKo:0.5") or an
+    iterable of combos ("AcKd" or cards tuples), possibly paired with their weight.
+    Malformed tokens raise ValueError
+    """
+    combos = {}
+    if isinstance(hand_range, str):
+        items = []
+        for token in hand_range.replace(",", " ").split():
+            part, _, weight = token.partition(":")
+            items.extend((hand, float(weight) if weight else 1.) for hand in _range_token(part))
+    else:
+        items = []
+        for item in hand_range:
+            weight = 1.
+            if not isinstance(item, str) and isinstance(item[1], (int, float)) and not isinstance(item[0], int):
+                item, weight = item
+            hands = _range_token(item) if isinstance(item, str) else [item]
+            items.extend((hand, weight) for hand in hands)
+    for hand, weight in items:
+        hand = tuple(sorted(map(to_int, hand)))
+        if hand[0] == hand[1]:
+            raise ValueError("Invalid combo {}".format(cards_str(hand)))
+        combos[hand] = weight
+    return combos
+
+
+def _prefix_weights(entries):
+    entries.sort()
+    return [value for value, _ in entries], list(accumulate((weight for _, weight in entries), initial=0))
+
+
+def _count_below(prefix, value):
+    """
+    Return the (lower, equal, total) weights of a _prefix_weights structure around value
+    """
+    values, weights = prefix
+    low, high = bisect_left(values, value), bisect_right(values, value)
+    return weights[low], weights[high] - weights[low], weights[-1]
+
+
+def _range_versus(hands, faces, stats):
+    """
+    Accumulate in stats the (win, tie, total) opposing weights of every hand of hands facing
+    the scored faces of the board, without the faces sharing a card with the hand
+    """
+    by_card = {}
+    for value, weight, combo, _ in faces:
+        by_card.setdefault(combo[0], []).append((value, weight))
+        by_card.setdefault(combo[1], []).append((value, weight))
+    everyone = _prefix_weights([(value, weight) for value, weight, _, _ in faces])
+    by_card = {card: _prefix_weights(entries) for card, entries in by_card.items()}
+    same = {combo: (value, weight) for value, weight, combo, _ in faces}
+    empty = ([], [0])
+
+    for value, _, combo, index in hands:
+        lower, equal, total = _count_below(everyone, value)
+        for card in combo:
+            card_lower, card_equal, card_total = _count_below(by_card.get(card, empty), value)
+            lower, equal, total = lower - card_lower, equal - card_equal, total - card_total
+        if combo in same:
+            # the face holding the very same cards has been removed twice
+            equal += same[combo][1]
+            total += same[combo][1]
+        win, tie, count = stats[index]
+        stats[index] = (win + lower, tie + equal, count + total)
+
 
-def poker_solve_multi():
-    number_of_processes = 4
+def range_equity(main_range, face_range, partial_flop=(), dead_cards=()):
+    """
+    Equity of two weighted ranges (see parse_range) on the boards completing partial_flop
+    without dead_cards. Every combo is scored once per board and its score shared by all its
+    pairings, conflicting pairings being removed by card. Return the (main, face) equities
+    and the equity of each combo of both ranges as {combo: equity} dicts.
+    """
+    main_range, face_range = parse_range(main_range), parse_range(face_range)
+    deck, _, _, partial_flop = deal((), (), partial_flop, dead_cards)
+    flop_key, flop_mask = hand_key(partial_flop)
+    main_combos = [(combo, weight) + hand_key(combo) for combo, weight in main_range.items()
+                   if not cards_mask(combo) & ~deck.mask]
+    face_combos = [(combo, weight) + hand_key(combo) for combo, weight in face_range.items()
+                   if not cards_mask(combo) & ~deck.mask]
+    main_stats = [(0, 0, 0)] * len(main_combos)
+    face_stats = [(0, 0, 0)] * len(face_combos)
+
+    for flop in combinations(deck, 5 - len(partial_flop)):
+        key, mask = hand_key(flop)
+        key, mask = key + flop_key, mask | flop_mask
+        main_scored = [(weigh_key(key + combo_key, mask | combo_mask), weight, combo, index)
+                       for index, (combo, weight, combo_key, combo_mask) in enumerate(main_combos)
+                       if not combo_mask & mask]
+        face_scored = [(weigh_key(key + combo_key, mask | combo_mask), weight, combo, index)
+                       for index, (combo, weight, combo_key, combo_mask) in enumerate(face_combos)
+                       if not combo_mask & mask]
+        _range_versus(main_scored, face_scored, main_stats)
+        _range_versus(face_scored, main_scored, face_stats)
+
+    def equities(combos, stats):
+        per_combo, win, count = {}, 0, 0
+        for (combo, weight, _, _), (combo_win, combo_tie, combo_count) in zip(combos, stats):
+            if combo_count:
+                per_combo[combo] = (combo_win + combo_tie / 2) / combo_count
+                win += weight * (combo_win + combo_tie / 2)
+                count += weight * combo_count
+        return (win / count if count else 0.), per_combo
+
+    main_equity, main_per_combo = equities(main_combos, main_stats)
+    face_equity, face_per_combo = equities(face_combos, face_stats)
+    return main_equity, face_equity, main_per_combo, face_per_combo
+
+
+def _showdown(values, weight, wins, splits) -> None:
+    """
+    Credit weight to the single winner of values in wins, or to each of the tied winners in
+    splits[player][number of winners]
+    """
+    best = max(values)
+    winners = [player for player, value in enumerate(values) if value == best]
+    if len(winners) == 1:
+        wins[winners[0]] += weight
+    else:
+        for player in winners:
+            splits[player][len(winners)] += weight
+
+
+def poker_solve_multiway(hands, partial_flop=(), unknown=0, dead_cards=(), samples=None, seed=0):
+    """
+    Equity of several known hands, plus unknown opponents holding any remaining cards, on
+    every board completing partial_flop, dead_cards being out of both. Each hand is scored
+    once per board, a single unknown hand being counted through face_histogram. Sets of two
+    or more unknown hands are too many to enumerate: they need samples, the number of
+    random (board, unknown holdings) deals of the random stream of seed to play instead,
+    which can also estimate any other spot. The unknown seats share their results equally.
+    Return (win share, split pot share, equity) for each known hand then each unknown seat,
+    a pot split between n players counting 1/n to each of them.
+    """
+    deck, _, _, partial_flop = deal((), (), partial_flop, dead_cards)
+    hands = [tuple(map(deck.get, hand)) for hand in hands]
+    players = len(hands) + unknown
+    if players < 2:
+        raise ValueError("At least 2 players are needed")
+    if unknown > 1 and samples is None:
+        raise ValueError("{} unknown seats cannot be enumerated exactly, pass samples to play random "
+                         "deals instead".format(unknown))
+
+    keys = [hand_key(hand + partial_flop) for hand in hands]
+    flop_key, flop_mask = hand_key(partial_flop)
+    blocks = suit_blocks(*map(cards_mask, hands), cards_mask(partial_flop), deck.mask)
+    deck_counts = [0] * 13
+    for card in deck:
+        deck_counts[card % 13] += 1
+
+    wins = [0] * players
+    splits = [[0] * (players + 1) for _ in range(players)]
+    total = 0
+    if samples is not None:
+        rng = random.Random(seed)
+        deck_cards = tuple(deck)
+        size = 5 - len(partial_flop)
+        for _ in range(samples):
+            drawn = rng.sample(deck_cards, size + 2 * unknown)
+            key, mask = hand_key(drawn[:size])
+            board_key, board_mask = flop_key + key, flop_mask | mask
+            values = [weigh_key(hand_key + key, hand_mask | mask) for hand_key, hand_mask in keys]
+            for i in range(size, len(drawn), 2):
+                holding_key, holding_mask = hand_key(drawn[i:i + 2])
+                values.append(weigh_key(board_key + holding_key, board_mask | holding_mask))
+            _showdown(values, 1, wins, splits)
+        total = samples
+    else:
+        for flop, weight in iso_boards(deck, 5 - len(partial_flop), blocks):
+            key, mask = hand_key(flop)
+            values = [weigh_key(hand_key + key, hand_mask | mask) for hand_key, hand_mask in keys]
+            board_key, board_mask = flop_key + key, flop_mask | mask
+            if not unknown:
+                _showdown(values, weight, wins, splits)
+                total += weight
+            else:
+                # a single unknown hand only matters through its score
+                value_counts = deck_counts[:]
+                for card in flop:
+                    value_counts[card % 13] -= 1
+                best = max(values)
+                winners = [player for player, value in enumerate(values) if value == best]
+                histogram = face_histogram(board_key, board_mask, value_counts, deck.mask & ~mask)
+                for face_value, count in histogram.items():
+                    if face_value > best:
+                        wins[-1] += weight * count
+                    elif face_value == best:
+                        for player in winners + [players - 1]:
+                            splits[player][len(winners) + 1] += weight * count
+                    elif len(winners) == 1:
+                        wins[winners[0]] += weight * count
+                    else:
+                        for player in winners:
+                            splits[player][len(winners)] += weight * count
+                    total += weight * count
+
+    shares = [[wins[player], sum(count / n for n, count in enumerate(splits[player]) if count)]
+              for player in range(players)]
+    if unknown > 1:
+        unknown_share = [sum(share[i] for share in shares[len(hands):]) / unknown for i in range(2)]
+        shares[len(hands):] = [unknown_share[:] for _ in range(unknown)]
+    return [(win / total, split / total, (win + split) / total) for win, split in shares]
+
+
+def street_equity(main_hand, face_hand, partial_flop=(), dead_cards=()):
+    """
+    Walk the board tree street by street from partial_flop, without dead_cards: the state
+    of each known board (key and mask of both hands) is extended one card at a time, so
+    that each 7 cards score is derived from its 6 cards parent, and each (turn, river) pair of a flop is played once
+    and credited to both of its turn cards. Return the hero (win, lose, tie) counts of the
+    remaining boards, of each flop as {flop: counts} and of each turn card of each flop as
+    {flop: {turn card: counts}}, flops being sorted tuples of cards. face_hand must be
+    known, poker_solve_parallel handling an unknown opponent
+    """
+    if len(main_hand) != 2 or len(face_hand) != 2:
+        raise ValueError("street_equity needs two known 2 cards hands")
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+    main_key, main_mask = hand_key(main_hand)
+    face_key, face_mask = hand_key(face_hand)
+    flop_given, turn_given = partial_flop[:3], partial_flop[3:]
+
+    flops, turns = {}, {}
+    for drawn in combinations(deck, 3 - len(flop_given)):
+        flop = tuple(sorted(flop_given + drawn))
+        key, mask = hand_key(flop)
+        main_key5, main_mask5 = main_key + key, main_mask | mask
+        face_key5, face_mask5 = face_key + key, face_mask | mask
+        remaining = [card for card in deck if card not in drawn and card not in turn_given]
+        turn_counts = {}
+        if turn_given:
+            turn_rivers = [(turn_given[0], turn_given[1:] or remaining)]
+        else:
+            turn_rivers = [(turn, remaining[i + 1:]) for i, turn in enumerate(remaining)]
 
-    number_of_task = 4
+        for turn, rivers in turn_rivers:
+            main_key6, main_mask6 = main_key5 + CARD_KEY[turn], main_mask5 | CARD_MASK[turn]
+            face_key6, face_mask6 = face_key5 + CARD_KEY[turn], face_mask5 | CARD_MASK[turn]
+            for river in rivers:
+                main_value = weigh_key(main_key6 + CARD_KEY[river], main_mask6 | CARD_MASK[river])
+                face_value = weigh_key(face_key6 + CARD_KEY[river], face_mask6 | CARD_MASK[river])
+                outcome = 0 if main_value > face_value else 1 if main_value < face_value else 2
+                # the pair is credited to both of its cards, unless the turn card is given
+                for card in ((turn,) if turn_given else (turn, river)):
+                    turn_counts.setdefault(card, [0, 0, 0])[outcome] += 1
+                flops.setdefault(flop, [0, 0, 0])[outcome] += 1
+        turns[flop] = {card: tuple(counts) for card, counts in turn_counts.items()}
+        flops[flop] = tuple(flops[flop])
+
+    # every board is reached through each of the flops it holds
+    repeat = math.comb(5 - len(flop_given) - len(turn_given), 3 - len(flop_given))
+    counts = tuple(sum(flop_counts[i] for flop_counts in flops.values()) // repeat for i in range(3))
+    return counts, flops, turns
+
+
+def board_chunks(total: int, number_of_chunks: int):
+    """
+    Split range(total) into at most number_of_chunks contiguous (start, stop) ranges
+    """
+    number_of_chunks = max(1, min(number_of_chunks, total))
+    bounds = [total * i // number_of_chunks for i in range(number_of_chunks + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def chunk_order(number_of_chunks: int):
+    """
+    Indexes of number_of_chunks chunks in bit reversed order, so that the chunks taken in
+    that order at any point are spread evenly over the boards
+    """
+    bits = max(1, (number_of_chunks - 1).bit_length())
+    return sorted(range(number_of_chunks), key=lambda i: int(format(i, "0{}b".format(bits))[::-1], 2))
+
+
+CHUNKS_PER_PROCESS = 16
+# the streaming solvers use many small chunks and yield a snapshot every
+# SNAPSHOT_CHUNKS of them, so that even their first snapshot samples the whole board space
+STREAM_CHUNKS = 1024
+SNAPSHOT_CHUNKS = 16
+# win, lose, tie, boards and evaluations slots of each chunk in the shared counters
+CHUNK_COUNTERS = 5
+# seconds between two checks that the workers are alive while waiting for a chunk
+WORKER_POLL = 1.
+
+
+CHECKPOINT_MAGIC = b"PKSCKP01"
+CHECKPOINT_SYNC = 5.
+
+
+class Checkpoint:
+    """
+    Append only file of the chunks done by a run: a header of the run (its identifying
+    integers and number of chunks), then one (chunk, win, lose, tie, boards, evaluations)
+    record per chunk done. Records are flushed as they come and synced to disk at most
+    every CHECKPOINT_SYNC seconds, a record cut short by a crash being dropped on reading
+    """
+    def __init__(self, path, run, number_of_chunks):
+        self.path = path
+        self.chunks = {}
+        header = array("q", list(run) + [number_of_chunks])
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            header_size = len(CHECKPOINT_MAGIC) + header.itemsize * len(header)
+            saved = array("q", data[len(CHECKPOINT_MAGIC):header_size])
+            if data[:len(CHECKPOINT_MAGIC)] != CHECKPOINT_MAGIC or saved[:-1] != header[:-1]:
+                raise ValueError("{} is the checkpoint of another run".format(path))
+            # chunks are the ones of the interrupted run, whatever the number of processes
+            number_of_chunks = saved[-1]
+            record_size = header.itemsize * 6
+            end = header_size + (len(data) - header_size) // record_size * record_size
+            records = array("q", data[header_size:end])
+            for i in range(0, len(records), 6):
+                chunk, win, lose, tie, boards, evaluations = records[i:i + 6]
+                self.chunks[chunk] = ((win, lose, tie), boards, evaluations)
+            self.file = open(path, "r+b")
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(CHECKPOINT_MAGIC + header.tobytes())
+            self.file.flush()
+        self.number_of_chunks = number_of_chunks
+        self.synced = time.time()
+
+    def add(self, chunk, counts, boards, evaluations):
+        self.chunks[chunk] = (tuple(counts), boards, evaluations)
+        self.file.write(array("q", [chunk, *counts, boards, evaluations]).tobytes())
+        self.file.flush()
+        if time.time() - self.synced >= CHECKPOINT_SYNC:
+            os.fsync(self.file.fileno())
+            self.synced = time.time()
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def _chunk_tasks(main_hand, face_hand, partial_flop, deck, number_of_chunks):
+    """
+    (main_hand, face_hand, partial_flop, deck, start, stop) tasks splitting the suit
+    isomorphic boards completing partial_flop in number_of_chunks
+    """
+    blocks = suit_blocks(cards_mask(main_hand), cards_mask(face_hand), cards_mask(partial_flop), deck.mask)
+    total = iso_count(deck, 5 - len(partial_flop), blocks)
+    return [(main_hand, face_hand, partial_flop, deck, start, stop)
+            for start, stop in board_chunks(total, number_of_chunks)]
+
+
+def _iter_submission(main_hand, face_hand, partial_flop, deck, number_of_processes,
+                     number_of_chunks=None, done_chunks=(), categories: HandCategories = None):
+    """
+    Run poker_solve_submission in number_of_processes processes over every board completing
+    partial_flop, split in number_of_chunks chunks (CHUNKS_PER_PROCESS per process by default)
+    but the ones of done_chunks, handed out in chunk_order, and yield the (worker, chunk,
+    counts, boards, evaluations, cpu_time) report of each chunk as it is done, chunk and
+    counts being None once a worker is out of tasks. The hand categories of each chunk are
+    added to categories before its report. The workers are terminated if the generator is
+    closed before the end
+    """
     tasks_to_accomplish = Queue()
     tasks_that_are_done = Queue()
     processes = []
 
+    # Boards are split in many chunks handed out on demand, each worker starting a
+    # chunk directly at its first board
+    tasks = _chunk_tasks(main_hand, face_hand, partial_flop, deck,
+                         number_of_chunks or number_of_processes * CHUNKS_PER_PROCESS)
+    counters = Array("q", CHUNK_COUNTERS * len(tasks), lock=False)
+    category_counters = Array("q", CATEGORY_COUNTERS * len(tasks), lock=False) if categories is not None else None
+    for i in chunk_order(len(tasks)):
+        if i not in done_chunks:
+            tasks_to_accomplish.put((i,) + tasks[i])
+    for _ in range(number_of_processes):
+        tasks_to_accomplish.put(None)
+
+    # creating processes
+    for _ in range(number_of_processes):
+        p = Process(target=poker_solve_submission,
+                    args=(tasks_to_accomplish, tasks_that_are_done, counters, category_counters))
+        processes.append(p)
+        p.start()
+
+    finished = 0
+    try:
+        while finished < number_of_processes:
+            try:
+                worker, task_num, cpu_time = tasks_that_are_done.get(timeout=WORKER_POLL)
+            except queue.Empty:
+                # a worker killed (out of memory, crash) would never report its chunk
+                for p in processes:
+                    if p.exitcode:
+                        raise RuntimeError("Worker {} exited with code {}".format(p.name, p.exitcode))
+                continue
+            if task_num is None:
+                finished += 1
+                yield worker, None, None, 0, 0, cpu_time
+                continue
+            win, lose, tie, boards, evaluations = counters[CHUNK_COUNTERS * task_num:CHUNK_COUNTERS * (task_num + 1)]
+            if categories is not None:
+                categories.add(category_counters[CATEGORY_COUNTERS * task_num:CATEGORY_COUNTERS * (task_num + 1)])
+            yield worker, task_num, (win, lose, tie), boards, evaluations, cpu_time
+    finally:
+        if finished < number_of_processes:
+            for p in processes:
+                p.terminate()
+            for p in processes:
+                p.join()
+
+    # completing process
+    for p in processes:
+        p.join()
+
+
+def _run_submission(main_hand, face_hand, partial_flop, deck, number_of_processes,
+                    progress: SolveProgress = None, observer: ProgressObserver = None, checkpoint=None,
+                    categories: HandCategories = None):
+    """
+    Run poker_solve_submission in number_of_processes processes over every board completing
+    partial_flop, and return the (win, lose, tie) counts of each worker. progress is fed and
+    observer updated each time a worker is done with a chunk. With a checkpoint file path,
+    the chunks done are saved to it and the ones already in it are not solved again, their
+    counts being returned as the ones of a "checkpoint" worker. Checkpoints only hold the
+    counts, so they cannot be used along with categories
+    """
+    if checkpoint is not None and categories is not None:
+        raise ValueError("Hand categories are not saved in checkpoints")
+    results = {}
+    number_of_chunks, done_chunks = None, {}
+    if checkpoint is not None:
+        blocks = suit_blocks(cards_mask(main_hand), cards_mask(face_hand), cards_mask(partial_flop), deck.mask)
+        checkpoint = Checkpoint(checkpoint, (
+            cards_mask(main_hand), cards_mask(face_hand), cards_mask(partial_flop), deck.mask,
+            iso_count(deck, 5 - len(partial_flop), blocks)), number_of_processes * CHUNKS_PER_PROCESS)
+        number_of_chunks, done_chunks = checkpoint.number_of_chunks, checkpoint.chunks
+        if done_chunks:
+            worker_counts = results.setdefault("checkpoint", [0, 0, 0])
+            for counts, boards, evaluations in done_chunks.values():
+                for i, count in enumerate(counts):
+                    worker_counts[i] += count
+                if progress is not None:
+                    progress.add(counts, evaluations, boards)
+
+    try:
+        for worker, chunk, counts, boards, evaluations, cpu_time in _iter_submission(
+                main_hand, face_hand, partial_flop, deck, number_of_processes, number_of_chunks, done_chunks,
+                categories):
+            worker_counts = results.setdefault(worker, [0, 0, 0])
+            if counts is None:
+                continue
+            if checkpoint is not None:
+                checkpoint.add(chunk, counts, boards, evaluations)
+            for i, count in enumerate(counts):
+                worker_counts[i] += count
+            if progress is not None:
+                progress.add(counts, evaluations, boards, worker, cpu_time)
+                if observer is not None:
+                    observer.update(progress)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    return [tuple(counts) for counts in results.values()]
+
+
+def poker_solve_stream(main_hand, face_hand=(), partial_flop=(), number_of_processes=None, dead_cards=()):
+    """
+    Generator version of poker_solve_parallel, yielding a (win, lose, tie, boards_done, total)
+    snapshot each time SNAPSHOT_CHUNKS chunks of boards are done, the last one holding the
+    final counts. The boards are split in STREAM_CHUNKS chunks solved in chunk_order, so
+    that each snapshot counts a sample spread over the whole board space rather than its
+    first boards in enumeration order. Closing the generator stops the workers
+    """
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+    total = math.comb(len(deck), 5 - len(partial_flop))
+    main_count, face_count, null_count, boards_done, chunks_done = 0, 0, 0, 0, 0
+    for _, _, counts, boards, _, _ in _iter_submission(
+            main_hand, face_hand, partial_flop, deck, number_of_processes or cpu_count(), STREAM_CHUNKS):
+        if counts is not None:
+            main_count += counts[0]
+            face_count += counts[1]
+            null_count += counts[2]
+            boards_done += boards
+            chunks_done += 1
+            if not chunks_done % SNAPSHOT_CHUNKS:
+                yield main_count, face_count, null_count, boards_done, total
+    if chunks_done % SNAPSHOT_CHUNKS:
+        yield main_count, face_count, null_count, boards_done, total
+
+
+def _solve_task(task):
+    return _solve_chunk(*task)
+
+
+def solve_exact(main_hand, face_hand, partial_flop, deck, chunk=0, number_of_chunks=1) -> Tuple[int, int, int]:
+    """
+    Hero (win, lose, tie) counts of the integer cards main_hand against face_hand, or
+    against any remaining holding when face_hand is empty, over every board completing
+    partial_flop with the cards of deck (see deal), in the current process. With
+    number_of_chunks, only the chunk-th part of the boards is solved, so that the parts of
+    a solve can be handed to a pool and their counts summed
+    """
+    blocks = suit_blocks(cards_mask(main_hand), cards_mask(face_hand), cards_mask(partial_flop), deck.mask)
+    chunks = board_chunks(iso_count(deck, 5 - len(partial_flop), blocks), number_of_chunks)
+    if chunk >= len(chunks):
+        return 0, 0, 0
+    counts, _, _ = _solve_chunk(main_hand, face_hand, partial_flop, deck, *chunks[chunk])
+    return counts
+
+
+async def poker_solve_async(main_hand, face_hand=(), partial_flop=(), number_of_processes=None,
+                            executor: ProcessPoolExecutor = None, dead_cards=()):
+    """
+    Asynchronous generator version of poker_solve_stream, the chunks being solved in a
+    process pool (executor, or a pool of number_of_processes processes owned by the call)
+    without blocking the event loop, in the same spread order of STREAM_CHUNKS chunks.
+    Cancelling the consuming task or closing the generator cancels the chunks not started yet
+    """
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+    number_of_processes = number_of_processes or cpu_count()
+    total = math.comb(len(deck), 5 - len(partial_flop))
+    tasks = _chunk_tasks(main_hand, face_hand, partial_flop, deck, STREAM_CHUNKS)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(number_of_processes)
+    loop = asyncio.get_running_loop()
+    futures = [loop.run_in_executor(executor, _solve_task, tasks[i]) for i in chunk_order(len(tasks))]
+    main_count, face_count, null_count, boards_done, chunks_done = 0, 0, 0, 0, 0
+    try:
+        for future in asyncio.as_completed(futures):
+            counts, boards, _ = await future
+            main_count += counts[0]
+            face_count += counts[1]
+            null_count += counts[2]
+            boards_done += boards
+            chunks_done += 1
+            if not chunks_done % SNAPSHOT_CHUNKS or chunks_done == len(futures):
+                yield main_count, face_count, null_count, boards_done, total
+    finally:
+        for future in futures:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def poker_solve_parallel(main_hand, face_hand=(), partial_flop=(), number_of_processes=None,
+                         observer: ProgressObserver = None, dead_cards=(), checkpoint=None,
+                         categories: HandCategories = None):
+    """
+    Hero (win, lose, tie) counts of main_hand against face_hand, or against any remaining
+    holding when face_hand is empty, over every board completing partial_flop, the boards
+    being shared between number_of_processes worker processes. dead_cards are removed from
+    the deck up front, out of the boards and of the opponent holdings. With a checkpoint
+    file path, the run can be interrupted and restarted with the same arguments, the chunks
+    already done being read back from the file. A HandCategories passed as categories gets
+    the weights of each player final hand category, by outcome, from the same pass
+    """
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+    total = math.comb(len(deck), 5 - len(partial_flop))
+    progress = SolveProgress(total) if observer is not None else None
+    results = _run_submission(main_hand, face_hand, partial_flop, deck, number_of_processes or cpu_count(),
+                              progress, observer, checkpoint, categories)
+    if observer is not None:
+        observer.on_finish(progress)
+    return tuple(map(sum, zip(*results)))
+
+
+def poker_solve_multi(cache: EquityCache = None, number_of_processes: int = None,
+                      observer: ProgressObserver = None,
+                      dead_cards=("8H", "5S", "6C", "4H", "6H", "5C", "JH", "2S"),
+                      checkpoint: str = None, categories: HandCategories = None) -> Tuple[int, int, int]:
+    number_of_processes = number_of_processes or cpu_count()
+    observer = observer if observer is not None else BarObserver()
+
     t0, t0b = time.time(), time.process_time()
-    # cards =[MyCard(value, suit) for value in VALUES for suit in SUITS]
-    deck = Deck(cards=[MyCard(value, suit) for value in VALUES for suit in SUITS], build=False)
-    deck.shuffle()
-    # main_hand = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["AS", "6H"]))
-    # main_hand = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["TD", "TS"]))
-    # main_hand = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["AC", "KD"]))
-    # main_hand = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["AH", "3D"]))
-    main_hand = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["AC", "QH"]))
+    deck = IntDeck()
+    # main_hand = tuple(map(deck.get, ["AS", "6H"]))
+    # main_hand = tuple(map(deck.get, ["TD", "TS"]))
+    # main_hand = tuple(map(deck.get, ["AC", "KD"]))
+    # main_hand = tuple(map(deck.get, ["AH", "3D"]))
+    main_hand = tuple(map(deck.get, ["AC", "QH"]))
     partial_flop = ()
-    partial_flop = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KH"]))
-    # partial_flop = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KH", "KD"]))
-    # partial_flop = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KD", "TC", "JS", "TD"]))
-    # partial_flop = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["7C", "2D", "7S", "4C"]))
-    # partial_flop = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["9C", "6D", "JC", "7C", "2S"]))
+    partial_flop = tuple(map(deck.get, ["KH"]))
+    # partial_flop = tuple(map(deck.get, ["KH", "KD"]))
+    # partial_flop = tuple(map(deck.get, ["KD", "TC", "JS", "TD"]))
+    # partial_flop = tuple(map(deck.get, ["7C", "2D", "7S", "4C"]))
+    # partial_flop = tuple(map(deck.get, ["9C", "6D", "JC", "7C", "2S"]))
     face_card = ()
-    # face_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["7C", "8C"]))
-    # face_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KS", "7S"]))
-    # face_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KC", "KH"]))
-    # face_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KC", "JC"]))
-    face_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["TC", "TH"]))
+    # face_card = tuple(map(deck.get, ["7C", "8C"]))
+    # face_card = tuple(map(deck.get, ["KS", "7S"]))
+    # face_card = tuple(map(deck.get, ["KC", "KH"]))
+    # face_card = tuple(map(deck.get, ["KC", "JC"]))
+    face_card = tuple(map(deck.get, ["TC", "TH"]))
     # worker = CustomWorker(main_hand, face_card, partial_flop)
     # worker = CustomWorker(main_hand, hand_cards[0], partial_flop)
-    # droped_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["KH", "4C", "5D", "2C", "TC", "2D", "QH", "8C"]))
-    droped_card = tuple(map(lambda c: deck.get(MyCard(c).name)[0], ["8H", "5S", "6C", "4H", "6H", "5C", "JH", "2S"]))
+    # droped_card = tuple(map(deck.get, ["KH", "4C", "5D", "2C", "TC", "2D", "QH", "8C"]))
+    droped_card = deck.remove(dead_cards)
 
-    # _ = deck.get(MyCard("9H").name)
-    # _ = deck.get(MyCard("5H").name)
-    # _ = deck.get(MyCard("QH").name)
-    # _ = deck.get(MyCard("6D").name)
+    # _ = deck.get("9H")
+    # _ = deck.get("5H")
+    # _ = deck.get("QH")
+    # _ = deck.get("6D")
 
     len_combi = math.comb(len(deck), 5 - len(partial_flop))
     len_faces = math.comb(len(deck) - 5 + len(partial_flop), 2)
 
     if face_card:
-        print("{} {}  VS  {} {},  Flop= {}   ({}, {})".format(
-            main_hand[0], main_hand[1],
-            face_card[0], face_card[1],
-            " ".join(map(str, partial_flop)),
+        print("{}  VS  {},  Flop= {}   ({}, {})".format(
+            cards_str(main_hand),
+            cards_str(face_card),
+            cards_str(partial_flop),
             len(deck), len_combi))
     else:
-        print("{} {}  VS  None,  Flop= {}   ({}, {}, {})".format(
-            main_hand[0], main_hand[1],
-            " ".join(map(str, partial_flop)),
+        print("{}  VS  None,  Flop= {}   ({}, {}, {})".format(
+            cards_str(main_hand),
+            cards_str(partial_flop),
             len(deck), len_combi, len_faces))
         len_combi *= len_faces
+
+    if cache is not None:
+        cache_key = matchup_key(main_hand, face_card, partial_flop, deck)
+        counts = cache.get(cache_key)
+        if counts is not None:
+            print_counts(*counts, len_combi)
+            return counts
     # for _, flop in enumerate(combinations(deck, 5 - len(partial_flop))):
         # tasks_to_accomplish.put(flop)
         # tasks_to_accomplish.put((main_hand, face_card, partial_flop, flop))
 
-    for i in range(number_of_task):
-        tmp_deck = deepcopy(deck)
-        tasks_to_accomplish.put((i, number_of_task, main_hand, face_card, partial_flop, tmp_deck))
-
-    # creating processes
-    for _ in range(number_of_processes):
-        # p = Process(target=worker.run, args=(tasks_to_accomplish, ))
-        # p = Process(target=worker.run, args=(tasks_to_accomplish, tasks_that_are_done))
-        # p = Process(target=do_job, args=(tasks_to_accomplish, tasks_that_are_done))
-        p = Process(target=poker_solve_submission, args=(tasks_to_accomplish, tasks_that_are_done))
-        processes.append(p)
-        p.start()
-
-    # completing process
-    for p in processes:
-        p.join()
-
-    # print the output
     print()
+    progress = SolveProgress(math.comb(len(deck), 5 - len(partial_flop)))
     main_count, face_count, null_count = 0, 0, 0
-    while not tasks_that_are_done.empty():
-        m, f, n = tasks_that_are_done.get()
+    results = _run_submission(main_hand, face_card, partial_flop, deck, number_of_processes, progress, observer,
+                              checkpoint, categories)
+    observer.on_finish(progress)
+    for m, f, n in results:
         print((m, f, n, sum([m, f, n]), len_combi))
         main_count += m
         face_count += f
         null_count += n
-        
-    print("{} {} {} {:.2f}     {:.2f}% {:.2f}% {:.2f}%".format(
-        main_count,
-        face_count,
-        len_combi - main_count - face_count,
-        main_count / (main_count + face_count) * 100,
-        main_count / len_combi * 100,
-        face_count / len_combi * 100,
-        null_count / len_combi * 100))
+
+    print_counts(main_count, face_count, null_count, len_combi)
+    if categories is not None:
+        categories.print()
     print("TIME=", time.time() - t0, time.process_time() - t0b)
+    if cache is not None:
+        cache.put(cache_key, (main_count, face_count, null_count))
     # print("{} {} {} {:.2f}     {:.2f}% {:.2f}% {:.2f}%".format(
     #     worker.main_count,
     #     worker.face_count,
@@ -423,104 +1966,84 @@ def poker_solve_multi():
     #     worker.main_count / len_combi * 100,
     #     worker.face_count / len_combi * 100,
     #     worker.null_count / len_combi * 100))
+    return main_count, face_count, null_count
 
-def poker_solve_submission(tasks_to_accomplish, tasks_that_are_done=None):
+def _solve_chunk(main_hand, face_hand, partial_flop, deck, start, stop, categories=None):
+    """
+    Hero (win, lose, tie) counts over the boards start to stop of the suit isomorphic
+    enumeration completing partial_flop, against any remaining holding when face_hand is
+    empty. Return (counts, boards counted with their weight, hand evaluations), opponent
+    holdings counting as evaluated hands. With a categories list of CATEGORY_COUNTERS
+    weights (see HandCategories), the category of both scores is added to it on the way
+    """
     main_count, face_count, null_count = 0, 0, 0
+    boards, evaluations = 0, (2 if face_hand else 1) * (stop - start)
+    blocks = suit_blocks(cards_mask(main_hand), cards_mask(face_hand), cards_mask(partial_flop), deck.mask)
+    main_key, main_mask = hand_key(main_hand + partial_flop)
+    if face_hand:
+        face_key, face_mask = hand_key(face_hand + partial_flop)
+    else:
+        face_key, face_mask = hand_key(partial_flop)
+        deck_counts = [0] * 13
+        for card in deck:
+            deck_counts[card % 13] += 1
+    for flop, weight in iso_boards(deck, 5 - len(partial_flop), blocks, start, stop):
+        boards += weight
+        key, mask = hand_key(flop)
+        main_value = weigh_key(main_key + key, main_mask | mask)
+        if face_hand:
+            face_value = weigh_key(face_key + key, face_mask | mask)
+            if main_value > face_value:
+                main_count += weight
+            elif main_value < face_value:
+                face_count += weight
+            else:
+                null_count += weight
+            if categories is not None:
+                outcome = 0 if main_value > face_value else 1 if main_value < face_value else 2
+                categories[3 * SCORE_CATEGORY[main_value] + outcome] += weight
+                categories[FACE_CATEGORIES + 3 * SCORE_CATEGORY[face_value] + (1, 0, 2)[outcome]] += weight
+        else:
+            value_counts = deck_counts[:]
+            for card in flop:
+                value_counts[card % 13] -= 1
+            histogram = face_histogram(face_key + key, face_mask | mask, value_counts, deck.mask & ~mask)
+            for face_value, count in histogram.items():
+                if main_value > face_value:
+                    main_count += weight * count
+                elif main_value < face_value:
+                    face_count += weight * count
+                else:
+                    null_count += weight * count
+                evaluations += count
+                if categories is not None and count:
+                    outcome = 0 if main_value > face_value else 1 if main_value < face_value else 2
+                    categories[3 * SCORE_CATEGORY[main_value] + outcome] += weight * count
+                    categories[FACE_CATEGORIES + 3 * SCORE_CATEGORY[face_value] + (1, 0, 2)[outcome]] += weight * count
+    return (main_count, face_count, null_count), boards, evaluations
+
+
+def poker_solve_submission(tasks_to_accomplish, tasks_that_are_done, counters, category_counters=None):
     while True:
-        try:
-            '''
-                try to get task from the queue. get_nowait() function will 
-                raise queue.Empty exception if the queue is empty. 
-                queue(False) function would do the same task also.
-            '''
-            task = tasks_to_accomplish.get_nowait()
-        except queue.Empty:
+        # blocking get until the None sentinel, get_nowait() could raise queue.Empty
+        # before the feeder thread of the parent has flushed every task
+        task = tasks_to_accomplish.get()
+        if task is None:
             break
         else:
-            task_num, num_proc, main_hand, face_hand, partial_flop, deck = task
-            # print(len(deck), current_process().name)
-            if not task_num:
-                # len_combi = math.comb(len(deck), 5 - len(partial_flop))
-                # progress_bar = ProgressBar(len_combi)
-                pass
-            count_iteration = 0
-            for i, flop in enumerate(combinations(deck, 5 - len(partial_flop))):
-                if not task_num:
-                    # progress_bar.update()
-                    pass
-                if i%num_proc != task_num:
-                    continue
-                full_flop = flop + partial_flop
-                main_full_flop = full_flop + main_hand
-                main_value = max(map(weigh_hand, combinations(main_full_flop, 5)))
-                if face_hand:
-                    face_full_flop = full_flop + face_hand
-                    face_value = max(map(weigh_hand, combinations(face_full_flop, 5)))
-                    # print(main_value, face_value, current_process().name)
-                    # print(task, current_process().name)
-                    if main_value > face_value:
-                        main_count += 1
-                        # if main_value > 0 and main_value < 9000:
-                        # #     if MyCard("AH") in full_flop:
-                        #     count_iteration += 1
-                        #     print("[{}] flop= {}, {} ({}), {} ({})".format(
-                        #         count_iteration,
-                        #         " ".join(map(str, full_flop)),
-                        #         " ".join(map(str, main_hand)), main_value,
-                        #         " ".join(map(str, face_hand)), face_value))
-                        #     print("main_count= {}, face_count= {}, null_count= {}".format(
-                        #         main_count, face_count, null_count))
-                    elif main_value < face_value:
-                        face_count += 1
-                        # if MyCard("AD") in full_flop:
-                        # count_iteration += 1
-                        # print("[{}] flop= {}, {} ({}), {} ({})".format(
-                        #     count_iteration,
-                        #     " ".join(map(str, full_flop)),
-                        #     " ".join(map(str, main_hand)), main_value,
-                        #     " ".join(map(str, face_hand)), face_value))
-                        # print("main_count= {}, face_count= {}, null_count= {}".format(
-                        #     main_count, face_count, null_count))
-                    else:
-                        null_count += 1
-                        count_iteration += 1
-                        # print("[{}] flop= {}, {} ({}), {} ({})".format(
-                        #     count_iteration,
-                        #     " ".join(map(str, full_flop)),
-                        #     " ".join(map(str, main_hand)), main_value,
-                        #     " ".join(map(str, face_hand)), face_value))
-                        # print("main_count= {}, face_count= {}, null_count= {}".format(
-                        #     main_count, face_count, null_count))
-                    # count_iteration += 1
-                    # print("[{}] flop= {}, {} ({}), {} ({})".format(
-                    #     count_iteration,
-                    #     " ".join(map(str, full_flop)),
-                    #     " ".join(map(str, main_hand)), main_value,
-                    #     " ".join(map(str, face_hand)), face_value))
-                    # print("main_count= {}, face_count= {}, null_count= {}".format(
-                    #     main_count, face_count, null_count))
-                else:
-                    tmp_deck = deepcopy(deck)
-                    for flop_card in flop:
-                        tmp_deck.get(flop_card.name)
-                    # len_face = math.comb(len(tmp_deck), 2))
-                    # print(len(deck), len(tmp_deck), len(flop), len_face, current_process().name)
-                    for tmp_face_hand in combinations(tmp_deck, 2):
-                    # for _, tmp_face_hand in enumerate(combinations(tmp_deck, 2)):
-                        face_full_flop = full_flop + tmp_face_hand
-                        face_value = max(map(weigh_hand, combinations(face_full_flop, 5)))
-                        # print(main_value, face_value, current_process().name)
-                        # print(task, current_process().name)
-                        if main_value > face_value:
-                            main_count += 1
-                        elif main_value < face_value:
-                            face_count += 1
-                        else:
-                            null_count += 1
-
-    tasks_that_are_done.put((main_count, face_count, null_count))
-    return True
+            task_num, main_hand, face_hand, partial_flop, deck, start, stop = task
+            categories = [0] * CATEGORY_COUNTERS if category_counters is not None else None
+            counts, boards, evaluations = _solve_chunk(main_hand, face_hand, partial_flop, deck, start, stop,
+                                                       categories)
+            if categories is not None:
+                category_counters[CATEGORY_COUNTERS * task_num:CATEGORY_COUNTERS * (task_num + 1)] = categories
+            # the counters of the chunk go to its own slots of the shared array, the
+            # queue only telling the parent which chunk is done
+            counters[CHUNK_COUNTERS * task_num:CHUNK_COUNTERS * (task_num + 1)] = counts + (boards, evaluations)
+            tasks_that_are_done.put((current_process().name, task_num, time.process_time()))
 
+    tasks_that_are_done.put((current_process().name, None, time.process_time()))
+    return True
 
 if __name__ == '__main__':
     poker_solve()
@@ -0,0 +1,23 @@
+import json
+
+from poker_solver import deal, solve_exact
+from poker_batch import run_batch
+
+
+def test_run_batch_writes_an_error_row_for_bad_lines(tmp_path):
+    matchups, results = tmp_path / "matchups.jsonl", tmp_path / "results.jsonl"
+    matchups.write_text("\n".join([
+        json.dumps({"id": 1, "hero": "AC QH", "villain": "TC TH", "board": "KH 7D 2S"}),
+        '{"id": 2, "hero": "AC QH", ',
+        "[1, 2]",
+        json.dumps({"id": 4, "hero": "AC", "board": "KH 7D 2S"}),
+        json.dumps({"id": 5, "hero": "AS QD", "villain": "TS TD", "board": "KD 7C 2H"}),
+    ]) + "\n")
+    stats = run_batch(str(matchups), str(results), 1)
+    rows = {row["line"]: row for row in map(json.loads, results.read_text().splitlines())}
+    assert sorted(rows) == [1, 2, 3, 4, 5]
+    assert all("error" in rows[line] for line in (2, 3, 4))
+    deck, hero, villain, board = deal(("AC", "QH"), ("TC", "TH"), ("KH", "7D", "2S"))
+    for line in (1, 5):
+        assert (rows[line]["win"], rows[line]["lose"], rows[line]["tie"]) == solve_exact(hero, villain, board, deck)
+    assert stats == {"rows": 5, "solved": 1, "reused": 1, "errors": 3}
@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+import pytest
+
+from poker_solver import deal, solve_exact
+from poker_preflop import HANDS, SWAPPED, PreflopMatrix, build_matrix, hand_index, main
+
+
+@lru_cache(maxsize=None)
+def exact(main_hand, face_hand):
+    deck, main_hand, face_hand, _ = deal(main_hand, face_hand)
+    return solve_exact(main_hand, face_hand, (), deck)
+
+
+@pytest.fixture(scope="module")
+def matrix_path(tmp_path_factory):
+    """
+    Matrix file with its first 2 matchups solved, 2D 3D against 4D 5D and against 4D 6D
+    """
+    path = str(tmp_path_factory.mktemp("preflop") / "preflop.bin")
+    missing = build_matrix(path, 2, limit=2)
+    matrix = PreflopMatrix(path)
+    assert len(matrix.pending()) == missing == matrix.number_of_matchups - 2
+    matrix.close()
+    return path
+
+
+def test_matrix_counts_match_solve_exact(matrix_path):
+    matrix = PreflopMatrix(matrix_path)
+    try:
+        assert matrix.index[hand_index(("4D", "5D")) * len(HANDS) + hand_index(("2D", "3D"))] & SWAPPED
+        for face_hand in (("4D", "5D"), ("4D", "6D")):
+            counts = exact(("2D", "3D"), face_hand)
+            assert matrix.counts(("2D", "3D"), face_hand) == counts
+            win, lose, tie = counts
+            assert matrix.counts(face_hand, ("3D", "2D")) == (lose, win, tie)
+        # suit isomorphic to a solved matchup
+        assert matrix.counts(("2S", "3S"), ("4S", "5S")) == exact(("2D", "3D"), ("4D", "5D"))
+        assert matrix.counts(("AC", "KC"), ("QH", "QS")) is None
+        with pytest.raises(ValueError):
+            matrix.counts(("2D", "3D"), ("3D", "4D"))
+    finally:
+        matrix.close()
+
+
+def test_matrix_hand_against_range(matrix_path, capsys):
+    matrix = PreflopMatrix(matrix_path)
+    try:
+        (win1, lose1, tie1), (win2, lose2, tie2) = exact(("2D", "3D"), ("4D", "5D")), exact(("2D", "3D"), ("4D", "6D"))
+        equity = (win1 + tie1 / 2 + 0.5 * (win2 + tie2 / 2)) / (win1 + lose1 + tie1 + 0.5 * (win2 + lose2 + tie2))
+        assert matrix.range_equity([("2D", "3D")], "5d4d, 6d4d:0.5") == pytest.approx(equity)
+        assert matrix.range_equity([("2D", "3D")], "AA") is None
+    finally:
+        matrix.close()
+    assert main(["query", matrix_path, "2D,3D", "5d4d"]) == 0
+    assert float(capsys.readouterr().out) == pytest.approx((win1 + tie1 / 2) / (win1 + lose1 + tie1))
+    assert main(["query", matrix_path, "2D,3D", "AKx"]) == 1
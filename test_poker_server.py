@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from poker_solver import deal, solve_exact
+from poker_server import SolverServer, SolverClient
+
+
+def exact(main_hand, face_hand=(), partial_flop=(), dead_cards=()):
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop, dead_cards)
+    return solve_exact(main_hand, face_hand, partial_flop, deck)
+
+
+class BrokenExecutor:
+    """
+    Executor of a pool whose worker died, refusing every submission
+    """
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    """
+    (server, path) of a SolverServer of 2 processes run by a thread on a Unix socket
+    """
+    path = str(tmp_path / "solver.sock")
+    server = SolverServer(2, batch_window=0.2)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    serving = asyncio.run_coroutine_threadsafe(server.serve(path=path), loop)
+    while not os.path.exists(path):
+        assert not serving.done(), serving.exception()
+        time.sleep(0.05)
+    yield server, path
+    executor = server.executor
+    loop.call_soon_threadsafe(serving.cancel)
+    while not serving.done():
+        time.sleep(0.05)
+    if executor is not None:
+        executor.shutdown()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def pipeline(path, requests):
+    """
+    Responses by id of requests written at once on a single connection
+    """
+    with SolverClient(path=path, timeout=120) as client:
+        for i, request in enumerate(requests):
+            client.file.write(json.dumps(dict(request, id=i)).encode() + b"\n")
+        client.file.flush()
+        responses = [json.loads(client.file.readline()) for _ in requests]
+    return {response["id"]: response for response in responses}
+
+
+def test_server_counts_match_solve_exact(server):
+    _, path = server
+    with SolverClient(path=path, timeout=120) as client:
+        response = client.solve(("AC", "QH"), ("TC", "TH"), ("KH",), ("8H", "5S"))
+        assert (response["win"], response["lose"], response["tie"]) == exact(
+            ("AC", "QH"), ("TC", "TH"), ("KH",), ("8H", "5S"))
+        response = client.solve(("AC", "QH"), (), ("KH", "7D", "2S"))
+        assert (response["win"], response["lose"], response["tie"]) == exact(("AC", "QH"), (), ("KH", "7D", "2S"))
+
+
+def test_server_coalesces_isomorphic_matchups(server):
+    solver, path = server
+    requests = [{"main": ["AC", "QH"], "face": ["TC", "TH"], "board": ["KH"]},
+                {"main": ["AS", "QD"], "face": ["TS", "TD"], "board": ["KD"]}]
+    responses = pipeline(path, requests)
+    expected = exact(("AC", "QH"), ("TC", "TH"), ("KH",))
+    for response in responses.values():
+        assert (response["win"], response["lose"], response["tie"]) == expected
+    assert solver.stats["coalesced"] == 1
+
+
+def test_server_batches_small_matchups(server):
+    solver, path = server
+    board = ["KH", "7D", "2S"]
+    matchups = [(["AC", "QH"], ["TC", "TH"]), (["9S", "8S"], ["AD", "KD"]), (["5C", "5H"], ["JC", "TD"])]
+    responses = pipeline(path, [{"main": main, "face": face, "board": board} for main, face in matchups])
+    for i, (main_hand, face_hand) in enumerate(matchups):
+        response = responses[i]
+        assert (response["win"], response["lose"], response["tie"]) == exact(main_hand, face_hand, board)
+    assert solver.stats["batches"] == 1 and solver.stats["batched"] == len(matchups)
+
+
+def test_server_answers_bad_requests_with_an_error(server):
+    solver, path = server
+    with SolverClient(path=path, timeout=120) as client:
+        with pytest.raises(ValueError):
+            client.solve(("AC",), ("TC", "TH"))
+        with pytest.raises(ValueError):
+            client.solve(("AC", "QH"), ("AC", "TH"))
+        client.file.write(b"not json\n")
+        client.file.flush()
+        response = json.loads(client.file.readline())
+        assert response["id"] is None and "error" in response
+        assert client.stats()["errors"] == 3
+
+
+def test_server_answers_when_the_pool_is_broken(server):
+    solver, path = server
+    pool, solver.executor = solver.executor, BrokenExecutor()
+    try:
+        with SolverClient(path=path, timeout=60) as client:
+            # batched and chunked requests alike
+            for board in (("KH", "7D", "2S"), ("KH",)):
+                with pytest.raises(ValueError, match="BrokenProcessPool"):
+                    client.solve(("AC", "QH"), ("TC", "TH"), board)
+    finally:
+        solver.executor = pool
@@ -0,0 +1,282 @@
+import os
+import math
+import random
+import multiprocessing
+from itertools import combinations
+from collections import Counter
+
+import pytest
+
+import poker_solver
+from poker_solver import (
+    MYCARDS, TABLES_PATH, RANK_TABLE, FLUSH_TABLE, HAND_CATEGORIES, SCORE_CATEGORY, CHUNKS_PER_PROCESS,
+    CHECKPOINT_MAGIC, IntDeck, to_int, deal, cards_mask, weigh_hand, weigh_best_hand, suit_blocks, iso_boards,
+    iso_count, parse_range, solve_exact, matchup_key, street_equity, poker_solve_parallel, poker_solve_numpy,
+    poker_solve_stream, poker_solve_multiway, poker_solve_monte_carlo, EquityCache, HandCategories)
+
+
+def brute_force(cards):
+    return max(weigh_hand(tuple(MYCARDS[card] for card in hand)) for hand in combinations(cards, 5))
+
+
+@pytest.mark.parametrize("names", [
+    "AC 2D 3H 4S 5C",              # wheel
+    "AH 2H 3H 4H 5H",              # steel wheel
+    "AH 2H 3H 4H 5H 6H",           # six high straight flush over the steel wheel
+    "AS 2H 3H 4H 5H KD 6C",        # straight over the wheel
+    "AH 2H 3H 4H 5H 9H KD",        # steel wheel beside a flush
+    "KC KD KH 7S 7C 7D 2H",        # two sets of trips
+    "QC QD 9H 9S 4C 4D 8H",        # three pairs
+    "QC QD 9H 9S 4C 4D AH",        # three pairs, kicker from the lowest pair
+    "8C 8D 8H 8S 3C 3D 3H",        # quads plus trips
+    "8C 8D 8H 8S AC 3D 3H",        # quads, kicker over the pair
+    "TC JC QC KC AC 9C 8C",        # royal flush among seven suited cards
+])
+def test_weigh_best_hand_special_hands(names):
+    cards = [to_int(name) for name in names.split()]
+    assert weigh_best_hand(cards) == brute_force(cards)
+
+
+@pytest.mark.parametrize("size", [5, 6, 7])
+def test_weigh_best_hand_random_hands(size):
+    rng = random.Random(size)
+    for _ in range(1000):
+        cards = rng.sample(range(52), size)
+        assert weigh_best_hand(cards) == brute_force(cards), cards
+
+
+def test_tables_file_is_per_user_and_mapped(tmp_path, monkeypatch):
+    if hasattr(os, "getuid"):
+        assert "_{}_".format(os.getuid()) in os.path.basename(TABLES_PATH)
+    path = str(tmp_path / "tables.bin")
+    monkeypatch.setenv("POKER_SOLVER_TABLES", path)
+    rank_table, flush_table = poker_solver.build_tables()
+    assert os.path.exists(path) and isinstance(rank_table, memoryview)
+    assert rank_table == RANK_TABLE and flush_table == FLUSH_TABLE
+
+
+def exhaustive(main_hand, face_hand, partial_flop, dead_cards=()):
+    """
+    Hero (win, lose, tie) counts over every board, and every opponent holding when
+    face_hand is empty, without suit symmetry
+    """
+    deck = IntDeck()
+    main_hand, face_hand, partial_flop = (tuple(map(deck.get, cards)) for cards in (main_hand, face_hand, partial_flop))
+    deck.remove(dead_cards)
+    counts = [0, 0, 0]
+    for board in combinations(deck, 5 - len(partial_flop)):
+        board += partial_flop
+        main_value = weigh_best_hand(main_hand + board)
+        faces = [face_hand] if face_hand else combinations([card for card in deck if card not in board], 2)
+        for face in faces:
+            face_value = weigh_best_hand(face + board)
+            counts[0 if main_value > face_value else 1 if main_value < face_value else 2] += 1
+    return tuple(counts)
+
+
+DEAD = ("QD", "QS", "JC", "2H", "9H", "9S", "4D", "8C")
+MATCHUPS = [
+    (("AC", "QH"), ("TC", "TH"), ("KH", "7D", "2S"), ()),
+    (("AC", "QH"), ("TC", "TH"), ("KH", "7D"), DEAD[:6]),
+    (("AC", "KC"), ("QC", "JC"), ("5C",), ()),              # diamonds, hearts and spades interchangeable
+    (("AC", "QH"), (), ("KH", "KD", "6S", "2C"), ()),
+    (("AC", "QH"), (), ("KH", "7D", "2S"), DEAD),
+    (("AC", "KC"), (), ("5C", "9C", "2C", "JC"), ()),
+]
+
+
+@pytest.mark.parametrize("main_hand, face_hand, partial_flop, dead_cards", MATCHUPS)
+def test_isomorphic_solve_matches_exhaustive(main_hand, face_hand, partial_flop, dead_cards):
+    expected = exhaustive(main_hand, face_hand, partial_flop, dead_cards)
+    assert poker_solve_parallel(main_hand, face_hand, partial_flop, 1, dead_cards=dead_cards) == expected
+
+
+@pytest.mark.parametrize("main_hand, face_hand, partial_flop, dead_cards",
+                         [matchup for matchup in MATCHUPS if matchup[1]])
+def test_numpy_solve_matches_exhaustive(main_hand, face_hand, partial_flop, dead_cards):
+    pytest.importorskip("numpy")
+    expected = exhaustive(main_hand, face_hand, partial_flop, dead_cards)
+    assert poker_solve_numpy(main_hand, face_hand, partial_flop, chunk_size=1000, dead_cards=dead_cards) == expected
+
+
+def test_iso_boards_weights_cover_every_board():
+    deck = IntDeck()
+    hands = [tuple(map(deck.get, cards)) for cards in (("AC", "KC"), ("QC", "JC"))]
+    blocks = suit_blocks(*map(cards_mask, hands), 0, deck.mask)
+    assert blocks == [(0, 2, 3)]
+    boards = list(iso_boards(deck, 3, blocks))
+    assert sum(weight for _, weight in boards) == math.comb(len(deck), 3)
+    assert len(boards) == iso_count(deck, 3, blocks) < math.comb(len(deck), 3)
+
+
+@pytest.mark.parametrize("hand_range, size", [
+    ("AA KK", 12), ("AA, KK", 12), ("AKs", 4), ("AKo", 12), ("AK", 16), ("QQ+", 18), ("AQs+", 8),
+    ("KK-TT", 24), ("A5s-A2s", 16), ("QKs-KTs", 12), ("KQs+", 4), ("AcKd", 1),
+    ("AKo:0.5 QQ", 18),
+])
+def test_parse_range(hand_range, size):
+    assert len(parse_range(hand_range)) == size
+
+
+@pytest.mark.parametrize("hand_range", [
+    "AKx", "AKsuited", "KKs", "A", "ZZ", "AKs++", "A5s-K2s", "KAs-KQs", "AQs-A2o", "XcKd",
+])
+def test_parse_range_rejects_malformed_tokens(hand_range):
+    with pytest.raises(ValueError):
+        parse_range(hand_range)
+
+
+def test_street_equity_matches_solver():
+    counts, flops, _ = street_equity(("AC", "QH"), ("TC", "TH"), ("KH", "7D"))
+    assert counts == poker_solve_parallel(("AC", "QH"), ("TC", "TH"), ("KH", "7D"), 1)
+    # each board is reached through the 3 flops holding both given cards
+    assert sum(map(sum, flops.values())) == 3 * sum(counts)
+
+
+def test_street_equity_rejects_unknown_opponent():
+    with pytest.raises(ValueError):
+        street_equity(("AC", "QH"), (), ("KH", "7D", "2S"))
+
+
+def test_stream_snapshots_are_spread_over_the_boards():
+    snapshots = list(poker_solve_stream(("AC", "QH"), ("TC", "TH"), ("KH",), 1))
+    win, lose, tie, boards, total = snapshots[-1]
+    assert (win, lose, tie) == poker_solve_parallel(("AC", "QH"), ("TC", "TH"), ("KH",), 1)
+    assert boards == total
+    first_win, first_lose, first_tie, first_boards, _ = snapshots[0]
+    assert first_boards < total / 32
+    equity = (win + tie / 2) / (win + lose + tie)
+    assert abs((first_win + first_tie / 2) / (first_win + first_lose + first_tie) - equity) < 0.02
+
+
+def test_multiway_samples_estimate_exact_equities():
+    hands = [("AC", "QH"), ("TC", "TH"), ("9S", "8S")]
+    exact = poker_solve_multiway(hands, ("KH", "7D", "2S"))
+    sampled = poker_solve_multiway(hands, ("KH", "7D", "2S"), samples=20000)
+    for (_, _, equity), (_, _, estimate) in zip(exact, sampled):
+        assert abs(equity - estimate) < 0.02
+
+
+def test_multiway_several_unknown_seats_need_samples():
+    with pytest.raises(ValueError):
+        poker_solve_multiway([("AC", "QH"), ("TC", "TH")], ("KH", "7D", "2S"), unknown=2)
+    shares = poker_solve_multiway([("AC", "QH")], (), unknown=3, samples=2000)
+    assert len(shares) == 4 and shares[1] == shares[2] == shares[3]
+    assert abs(sum(equity for _, _, equity in shares) - 1) < 1e-9
+
+
+def test_solve_exact_chunks_add_up():
+    deck, main_hand, face_hand, partial_flop = deal(("AC", "QH"), ("TC", "TH"), ("KH", "7D"), ("8H", "5S"))
+    counts = solve_exact(main_hand, face_hand, partial_flop, deck)
+    assert counts == exhaustive(("AC", "QH"), ("TC", "TH"), ("KH", "7D"), ("8H", "5S"))
+    chunks = [solve_exact(main_hand, face_hand, partial_flop, deck, chunk, 5) for chunk in range(5)]
+    assert tuple(map(sum, zip(*chunks))) == counts
+
+
+def test_dead_worker_fails_the_solve(monkeypatch):
+    solve_chunk = poker_solver._solve_chunk
+
+    def dying(main_hand, face_hand, partial_flop, deck, start, stop, categories=None):
+        if not start:
+            os._exit(1)
+        return solve_chunk(main_hand, face_hand, partial_flop, deck, start, stop, categories)
+
+    # the forked workers inherit the patched module
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("workers are not forked")
+    monkeypatch.setattr(poker_solver, "_solve_chunk", dying)
+    with pytest.raises(RuntimeError):
+        poker_solve_parallel(("AC", "QH"), ("TC", "TH"), ("KH", "7D"), 2)
+
+
+def test_checkpoint_resumes_with_identical_counts(tmp_path):
+    path = str(tmp_path / "run.ckp")
+    hands = ("AC", "QH"), ("TC", "TH"), ("KH",)
+    expected = poker_solve_parallel(*hands, 2)
+    assert poker_solve_parallel(*hands, 2, checkpoint=path) == expected
+    # a run interrupted after 10 chunks, the 11th record cut short
+    header_size, record_size = len(CHECKPOINT_MAGIC) + 8 * 6, 8 * 6
+    with open(path, "r+b") as f:
+        f.truncate(header_size + 10 * record_size + record_size // 2)
+    # resumed with another number of processes, on the chunks of the first run
+    assert poker_solve_parallel(*hands, 3, checkpoint=path) == expected
+    assert os.path.getsize(path) == header_size + 2 * CHUNKS_PER_PROCESS * record_size
+
+
+def test_checkpoint_of_another_run_is_rejected(tmp_path):
+    path = str(tmp_path / "run.ckp")
+    poker_solve_parallel(("AC", "QH"), ("TC", "TH"), ("KH", "7D"), 2, checkpoint=path)
+    with pytest.raises(ValueError):
+        poker_solve_parallel(("AC", "QH"), ("TC", "TS"), ("KH", "7D"), 2, checkpoint=path)
+
+
+def key_of(main_hand, face_hand, partial_flop):
+    deck, main_hand, face_hand, partial_flop = deal(main_hand, face_hand, partial_flop)
+    return matchup_key(main_hand, face_hand, partial_flop, deck)
+
+
+def test_equity_cache_memory_and_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = key_of(("AC", "QH"), ("TC", "TH"), ("KH",))
+    # suit permutation of the same matchup
+    assert key_of(("AS", "QD"), ("TS", "TD"), ("KD",)) == key
+    others = [key_of(("AC", "QH"), ("TC", "TH"), ("KH", "7D")), key_of(("AC", "QH"), (), ("KH",))]
+    cache = EquityCache(path, size=2)
+    assert cache.get(key) is None
+    cache.put(key, [1, 2, 3])
+    assert cache.get(key) == (1, 2, 3)
+    for i, other in enumerate(others):
+        cache.put(other, (i, i, i))
+    # evicted from memory, read back from the file
+    assert key not in cache.lru and len(cache.lru) == 2
+    assert cache.get(key) == (1, 2, 3)
+    assert others[0] not in cache.lru
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 1, "misses": 1, "hit_rate": 2 / 3, "memory_size": 2}
+    cache.close()
+
+    cache = EquityCache(path, size=2)
+    assert cache.get(key_of(("AS", "QD"), ("TS", "TD"), ("KD",))) == (1, 2, 3)
+    assert cache.get(key) == (1, 2, 3)
+    assert cache.get(key_of(("AC", "KH"), ("TC", "TH"), ("KS",))) is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+    cache.close()
+
+
+@pytest.mark.parametrize("main_hand, face_hand, partial_flop", [
+    (("AC", "QH"), ("TC", "TH"), ("KH", "7D")),
+    (("AC", "QH"), (), ("KH", "7D", "2S", "2C")),
+])
+def test_hand_categories_match_brute_force(main_hand, face_hand, partial_flop):
+    categories = HandCategories()
+    poker_solve_parallel(main_hand, face_hand, partial_flop, 1, categories=categories)
+    deck = IntDeck()
+    main_hand, face_hand, partial_flop = (tuple(map(deck.get, cards)) for cards in (main_hand, face_hand, partial_flop))
+    # (player, category, outcome of that player) weights
+    expected = Counter()
+    for board in combinations(deck, 5 - len(partial_flop)):
+        board += partial_flop
+        main_value = weigh_best_hand(main_hand + board)
+        faces = [face_hand] if face_hand else combinations([card for card in deck if card not in board], 2)
+        for face in faces:
+            face_value = weigh_best_hand(face + board)
+            outcome = 0 if main_value > face_value else 1 if main_value < face_value else 2
+            expected[0, HAND_CATEGORIES[SCORE_CATEGORY[main_value]], outcome] += 1
+            expected[1, HAND_CATEGORIES[SCORE_CATEGORY[face_value]], (1, 0, 2)[outcome]] += 1
+    for player in (0, 1):
+        assert categories.outcomes(player) == {
+            name: tuple(expected[player, name, outcome] for outcome in range(3)) for name in HAND_CATEGORIES}
+        assert categories.histogram(player) == {
+            name: sum(expected[player, name, outcome] for outcome in range(3)) for name in HAND_CATEGORIES}
+
+
+@pytest.mark.parametrize("face_hand", [("TC", "TH"), ()])
+def test_monte_carlo_is_reproducible_and_within_its_interval(face_hand):
+    runs = [poker_solve_monte_carlo(("AC", "QH"), face_hand, ("KH", "7D"), seed=7, precision=0,
+                                    max_samples=40000, number_of_processes=2, batch_size=5000) for _ in range(2)]
+    assert runs[0] == runs[1]
+    equity, error, counts = runs[0]
+    assert sum(counts) == 40000
+    deck, main_hand, face_hand, partial_flop = deal(("AC", "QH"), face_hand, ("KH", "7D"))
+    win, lose, tie = solve_exact(main_hand, face_hand, partial_flop, deck)
+    assert abs(equity - (win + tie / 2) / (win + lose + tie)) <= 1.96 * error